@@ -1,66 +1,66 @@
 import logging
+import time
+from bisect import bisect_left
 from datetime import datetime
+from functools import lru_cache
 
 from django import forms
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 
 logger = logging.getLogger(__name__)
 
 
 class Slot:
+    # immutable, compared and hashed on its bounds as UTC epoch minutes
+    __slots__ = ("start", "end", "_start", "_end", "_hash", "_str")
+
     def __init__(self, start, end):
-        self.start = start
-        self.end = end
+        object.__setattr__(self, "start", start)
+        object.__setattr__(self, "end", end)
+        object.__setattr__(self, "_start", int(start.timestamp()) // 60)
+        object.__setattr__(self, "_end", int(end.timestamp()) // 60)
+        object.__setattr__(self, "_hash", hash((self._start, self._end)))
+        object.__setattr__(self, "_str", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Slot is immutable, can't set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"Slot is immutable, can't delete {name}")
+
+    def __reduce__(self):
+        return (Slot, (self.start, self.end))
 
     def __repr__(self):
         return str(self)
 
     def __str__(self):
-        return self.start.isoformat() + "_" + self.end.isoformat()
+        if self._str is None:
+            object.__setattr__(
+                self, "_str", self.start.isoformat() + "_" + self.end.isoformat()
+            )
+        return self._str
 
     def __eq__(self, other):
         if not isinstance(other, Slot):
             return False
-        return self.start == other.start and self.end == other.end
+        return self._start == other._start and self._end == other._end
 
     def is_contained_by(self, other):
         if not isinstance(other, Slot):
             return False
-        if self.start < other.start:
-            return False
-        if self.end > other.end:
-            return False
-
-        return True
+        return other._start <= self._start and self._end <= other._end
 
     def __lt__(self, other):
-        if self.start < other.start:
-            return True
-        elif self.start == other.start:
-            return self.end < other.end
-        return False
+        return (self._start, self._end) < (other._start, other._end)
 
     def __hash__(self):
-        return hash((self.start, self.end))
+        return self._hash
 
     @staticmethod
     def aggregate(slots):
-        if not slots:
-            return []
-
-        result = []
-
-        sorted_slots = sorted(slots)
-
-        result.append(sorted_slots.pop(0))
-        while sorted_slots:
-            current = sorted_slots.pop(0)
-            if current.start <= result[-1].end:
-                result[-1].end = max(current.end, result[-1].end)
-            else:
-                result.append(current)
-
-        return result
+        return IntervalSet(slots).slots()
 
     @staticmethod
     def create_slots(duration, start_date, end_date):
@@ -75,6 +75,180 @@ class Slot:
         return slot_values
 
 
+class IntervalSet:
+    # sorted, disjoint and merged slots, touching slots are merged together
+    __slots__ = ("_slots",)
+
+    def __init__(self, slots=()):
+        merged = []
+        for current in sorted(slots):
+            if merged and current._start <= merged[-1]._end:
+                if current._end > merged[-1]._end:
+                    merged[-1] = Slot(merged[-1].start, current.end)
+            else:
+                merged.append(current)
+        self._slots = merged
+
+    @classmethod
+    def _from_merged(cls, slots):
+        result = cls()
+        result._slots = slots
+        return result
+
+    def slots(self):
+        return list(self._slots)
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __bool__(self):
+        return bool(self._slots)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return False
+        return self._slots == other._slots
+
+    def __repr__(self):
+        return f"IntervalSet({self._slots})"
+
+    def __contains__(self, slot):
+        return self.mask([slot])[0]
+
+    def union(self, other):
+        # both sides are sorted, merging them keeps the order
+        merged = []
+        i, j = 0, 0
+        left, right = self._slots, other._slots
+        while i < len(left) or j < len(right):
+            if j >= len(right) or (i < len(left) and left[i] < right[j]):
+                current, i = left[i], i + 1
+            else:
+                current, j = right[j], j + 1
+            if merged and current._start <= merged[-1]._end:
+                if current._end > merged[-1]._end:
+                    merged[-1] = Slot(merged[-1].start, current.end)
+            else:
+                merged.append(current)
+        return IntervalSet._from_merged(merged)
+
+    def intersection(self, other):
+        result = []
+        i, j = 0, 0
+        left, right = self._slots, other._slots
+        while i < len(left) and j < len(right):
+            start = left[i] if left[i]._start >= right[j]._start else right[j]
+            end = left[i] if left[i]._end <= right[j]._end else right[j]
+            if start._start < end._end:
+                result.append(Slot(start.start, end.end))
+            if left[i]._end <= right[j]._end:
+                i += 1
+            else:
+                j += 1
+        return IntervalSet._from_merged(result)
+
+    def difference(self, other):
+        result = []
+        j = 0
+        right = other._slots
+        for current in self._slots:
+            start = current.start
+            start_minutes = current._start
+            while j < len(right) and right[j]._end <= start_minutes:
+                j += 1
+            k = j
+            while k < len(right) and right[k]._start < current._end:
+                if right[k]._start > start_minutes:
+                    result.append(Slot(start, right[k].start))
+                start, start_minutes = right[k].end, right[k]._end
+                k += 1
+            if start_minutes < current._end:
+                result.append(Slot(start, current.end))
+        return IntervalSet._from_merged(result)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def mask(self, grid):
+        """Tell for each cell of a sorted grid if it is covered by the set."""
+        result = []
+        i = 0
+        for cell in grid:
+            while i < len(self._slots) and self._slots[i]._end <= cell._start:
+                i += 1
+            result.append(
+                i < len(self._slots)
+                and self._slots[i]._start <= cell._start
+                and cell._end <= self._slots[i]._end
+            )
+        return result
+
+    def covered(self, grid):
+        return [cell for cell, covered in zip(grid, self.mask(grid)) if covered]
+
+
+class SlotGrid:
+    # immutable grid of slots shared between users, with the index of each slot
+    __slots__ = ("slots", "index", "_starts")
+
+    def __init__(self, slots):
+        object.__setattr__(self, "slots", tuple(slots))
+        object.__setattr__(
+            self, "index", {slot: idx for idx, slot in enumerate(self.slots)}
+        )
+        object.__setattr__(self, "_starts", [slot._start for slot in self.slots])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"SlotGrid is immutable, can't set {name}")
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, idx):
+        return self.slots[idx]
+
+    def within(self, slot):
+        """Return the cells of the grid contained by ``slot``."""
+        result = []
+        for idx in range(bisect_left(self._starts, slot._start), len(self.slots)):
+            if self.slots[idx]._end > slot._end:
+                break
+            result.append(self.slots[idx])
+        return result
+
+
+# grids built by process, dropped by least recent use, the version stored in
+# the cache makes every process drop the grids of a changed event
+SLOT_GRIDS_SIZE = 256
+
+
+def _slot_grid_version_key(key):
+    return f"common:slot_grid:{key}"
+
+
+@lru_cache(maxsize=SLOT_GRIDS_SIZE)
+def _slot_grid(key, version, duration, start_date, end_date):
+    return SlotGrid(Slot.create_slots(duration, start_date, end_date))
+
+
+def slot_grid(key, duration, start_date, end_date):
+    """Return the grid of an event, built once by process and event version."""
+    version = cache.get_or_set(_slot_grid_version_key(key), time.time_ns, None)
+    return _slot_grid(key, version, duration, start_date, end_date)
+
+
+def forget_slot_grids(key):
+    # the stale grids of every process are left to age out of their cache
+    cache.set(_slot_grid_version_key(key), time.time_ns(), None)
+
+
 def str2slot(value):
     splitted = value.split("_")
     if len(splitted) != 2:
@@ -89,3 +263,103 @@ class SlotsField(forms.TypedMultipleChoiceField):
 
     def __init__(self, *args, **kwargs):
         super().__init__(coerce=str2slot, **kwargs)
+
+
+def _grid_index(grid):
+    if isinstance(grid, SlotGrid):
+        return grid.index
+    return {slot: idx for idx, slot in enumerate(grid)}
+
+
+def slots2mask(slots, grid):
+    index = _grid_index(grid)
+    mask = 0
+    for slot in slots:
+        if slot in index:
+            mask |= 1 << index[slot]
+    return format(mask, "x")
+
+
+def mask2slots(value, grid):
+    try:
+        mask = int(value or "0", 16)
+    except ValueError:
+        raise ValidationError("Invalid slots", code="invalid")
+    if mask < 0 or mask >> len(grid):
+        raise ValidationError("Invalid slots", code="invalid")
+    # bits from the lowest one, which is the first slot of the grid
+    return [grid[idx] for idx, bit in enumerate(bin(mask)[:1:-1]) if bit == "1"]
+
+
+class SlotsMaskWidget(forms.CheckboxSelectMultiple):
+    """One hidden hexadecimal mask, checkboxes are unnamed and set it by JS."""
+
+    def __init__(self, attrs=None, choices=()):
+        super().__init__(attrs, choices)
+        self.grid = ()
+
+    def value_from_datadict(self, data, files, name):
+        return data.get(name)
+
+    def value_omitted_from_data(self, data, files, name):
+        return name not in data
+
+    def format_value(self, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            try:
+                value = mask2slots(value, self.grid)
+            except ValidationError:
+                return []
+        return [str(slot) for slot in value]
+
+    def create_option(self, name, value, label, selected, index, *args, **kwargs):
+        option = super().create_option(
+            name, value, label, selected, index, *args, **kwargs
+        )
+        option["name"] = ""
+        option["attrs"] = option["attrs"] | {"data-mask": name, "data-index": index}
+        return option
+
+    def render(self, name, value, attrs=None, renderer=None):
+        mask = value if isinstance(value, str) else slots2mask(value or [], self.grid)
+        hidden = forms.HiddenInput().render(name, mask, renderer=renderer)
+        return hidden + super().render(name, value, attrs, renderer)
+
+
+class SlotsMaskField(forms.Field):
+    widget = SlotsMaskWidget
+
+    def __init__(self, *, grid=(), **kwargs):
+        super().__init__(**kwargs)
+        self.grid = grid
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid):
+        self._grid = grid
+        self.widget.grid = grid
+        self.widget.choices = [(str(slot), slot) for slot in grid]
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return []
+        return mask2slots(value, self._grid)
+
+    def prepare_value(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return slots2mask(value, self._grid)
+
+    def has_changed(self, initial, data):
+        if self.disabled:
+            return False
+        try:
+            data = self.to_python(data)
+        except ValidationError:
+            return True
+        return slots2mask(initial or [], self._grid) != slots2mask(data, self._grid)
@@ -1,8 +1,20 @@
+import pickle
 from datetime import datetime, timedelta
 
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-from .fields import Slot, str2slot
+from .fields import (
+    SLOT_GRIDS_SIZE,
+    IntervalSet,
+    Slot,
+    SlotsMaskField,
+    _slot_grid,
+    forget_slot_grids,
+    slot_grid,
+    str2slot,
+)
 
 
 class SlotTests(TestCase):
@@ -39,6 +51,16 @@ class SlotTests(TestCase):
             str(self.slot1), "2025-06-01T08:00:00+02:00_2025-06-01T10:00:00+02:00"
         )
 
+    def test_should_be_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.slot1.end = self.slot2.start
+        self.assertEqual(hash(self.slot1), hash(self.slot2))
+
+    def test_should_pickle(self):
+        slot = pickle.loads(pickle.dumps(self.slot1))
+        self.assertEqual(slot, self.slot1)
+        self.assertEqual(str(slot), str(self.slot1))
+
     def test_is_contained_by(self):
         slot1 = Slot(
             datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
@@ -105,6 +127,7 @@ class SlotTests(TestCase):
 
         result = Slot.aggregate([slot1, slot2, slot3])
 
+        self.assertEqual(slot1.end, datetime.fromisoformat("2025-06-01T09:00:00+02:00"))
         self.assertEqual(
             result,
             [
@@ -269,3 +292,100 @@ class Str2slotTests(TestCase):
             ),
         ]:
             self.assertEqual(str2slot(raw), expected)
+
+
+def slot(start, end):
+    return Slot(
+        datetime.fromisoformat(f"2025-06-01T{start}:00+02:00"),
+        datetime.fromisoformat(f"2025-06-01T{end}:00+02:00"),
+    )
+
+
+class IntervalSetTests(TestCase):
+    def setUp(self):
+        self.left = IntervalSet(
+            [slot("09:00", "10:00"), slot("08:00", "09:00"), slot("12:00", "14:00")]
+        )
+        self.right = IntervalSet([slot("09:30", "12:30"), slot("13:00", "13:30")])
+
+    def test_should_merge(self):
+        self.assertListEqual(
+            self.left.slots(), [slot("08:00", "10:00"), slot("12:00", "14:00")]
+        )
+
+    def test_union(self):
+        self.assertListEqual((self.left | self.right).slots(), [slot("08:00", "14:00")])
+
+    def test_intersection(self):
+        self.assertListEqual(
+            (self.left & self.right).slots(),
+            [slot("09:30", "10:00"), slot("12:00", "12:30"), slot("13:00", "13:30")],
+        )
+
+    def test_difference(self):
+        self.assertListEqual(
+            (self.left - self.right).slots(),
+            [slot("08:00", "09:30"), slot("12:30", "13:00"), slot("13:30", "14:00")],
+        )
+
+    def test_covered(self):
+        grid = Slot.create_slots(
+            timedelta(hours=1),
+            datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            datetime.fromisoformat("2025-06-01T14:00:00+02:00"),
+        )
+        self.assertListEqual(
+            self.left.mask(grid), [True, True, False, False, True, True]
+        )
+        self.assertListEqual(self.right.covered(grid), [grid[2], grid[3]])
+
+
+class SlotsMaskFieldTests(TestCase):
+    def setUp(self):
+        self.grid = Slot.create_slots(
+            timedelta(hours=1),
+            datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            datetime.fromisoformat("2025-06-01T14:00:00+02:00"),
+        )
+        self.field = SlotsMaskField(grid=self.grid, required=False)
+
+    def test_should_round_trip(self):
+        slots = [self.grid[0], self.grid[2], self.grid[5]]
+        mask = self.field.prepare_value(slots)
+        self.assertEqual(mask, "25")
+        self.assertListEqual(self.field.clean(mask), slots)
+        self.assertListEqual(self.field.clean(""), [])
+
+    def test_should_refuse_invalid_mask(self):
+        for mask in ["zz", "40", "-1"]:
+            with self.assertRaises(ValidationError):
+                self.field.clean(mask)
+
+    def test_should_render_unnamed_checkboxes(self):
+        html = self.field.widget.render("slots", [self.grid[1]])
+        self.assertIn('type="hidden" name="slots" value="2"', html)
+        self.assertEqual(html.count('name=""'), len(self.grid))
+        self.assertEqual(html.count("checked"), 1)
+
+
+class SlotGridTests(TestCase):
+    def setUp(self):
+        self.args = (
+            timedelta(hours=1),
+            datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            datetime.fromisoformat("2025-06-01T14:00:00+02:00"),
+        )
+
+    def test_should_share_grid_until_forgotten(self):
+        grid = slot_grid(-1, *self.args)
+        self.assertIs(slot_grid(-1, *self.args), grid)
+        self.assertEqual(_slot_grid.cache_info().maxsize, SLOT_GRIDS_SIZE)
+
+        forget_slot_grids(-1)
+        self.assertIsNot(slot_grid(-1, *self.args), grid)
+
+    def test_should_drop_grids_forgotten_by_another_process(self):
+        grid = slot_grid(-2, *self.args)
+        # another process bumps the version in the shared cache
+        cache.set("common:slot_grid:-2", 0, None)
+        self.assertIsNot(slot_grid(-2, *self.args), grid)
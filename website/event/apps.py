@@ -1,6 +1,18 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_save
 
 
 class EventConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "event"
+
+    def ready(self):
+        from .models import Event, forget_event_grids
+
+        for model in apps.get_models():
+            if issubclass(model, Event):
+                post_save.connect(
+                    forget_event_grids,
+                    sender=model,
+                    dispatch_uid=f"forget_event_grids_{model._meta.label}",
+                )
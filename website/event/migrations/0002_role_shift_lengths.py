@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 23:56
+
+import re
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("event", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="role",
+            name="shift_lengths",
+            field=models.CharField(
+                blank=True,
+                default="",
+                max_length=200,
+                validators=[
+                    django.core.validators.RegexValidator(
+                        re.compile("^\\d+(?:,\\d+)*\\Z"),
+                        code="invalid",
+                        message="Enter only digits separated by commas.",
+                    )
+                ],
+            ),
+        ),
+    ]
@@ -1,7 +1,13 @@
 import logging
-
-from common.fields import Slot
-from django.db import models
+import time
+from datetime import timedelta
+
+from common.fields import IntervalSet, Slot, forget_slot_grids
+from django.core.cache import cache
+from django.core.validators import validate_comma_separated_integer_list
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.timezone import now
 from django_extensions.db.fields import AutoSlugField
 
@@ -44,17 +50,68 @@ class Role(models.Model):
 
     with_validation_email = models.BooleanField(null=False, default=True)
 
+    # allowed shift lengths in minutes, empty means scheduled slot by slot
+    shift_lengths = models.CharField(
+        max_length=200,
+        null=False,
+        default="",
+        blank=True,
+        validators=[validate_comma_separated_integer_list],
+    )
+
     def __str__(self):
         return self.name
 
+    @property
+    def shift_durations(self):
+        return [
+            timedelta(minutes=int(length))
+            for length in self.shift_lengths.split(",")
+            if length and int(length) > 0
+        ]
+
     @property
     def slot(self):
         return Slot(self.start_date, self.end_date)
 
-    @property
-    def slots_for_event(self):
-        return [
-            slot
-            for slot in self.event.schedule_slots()
-            if slot.is_contained_by(self.slot)
-        ]
+    def slots_in(self, grid):
+        return IntervalSet([self.slot]).covered(grid)
+
+
+@receiver(post_delete, sender=Event)
+def forget_event_grids(sender, instance, **kwargs):
+    # forgetting the grids drops the old ones in every process
+    # post_delete of Event is also sent for subclasses, post_save is
+    # connected to each of them when the apps are ready
+    forget_slot_grids(instance.pk)
+
+
+def _version_key(event_id):
+    return f"event:version:{event_id}"
+
+
+def event_version(event_id):
+    """Version of the roles and volunteers of an event, shared by the workers
+    through the cache."""
+    return cache.get_or_set(_version_key(event_id), time.time_ns, None)
+
+
+def touch_events(event_ids):
+    """Change the version of the events, now and once committed, so that
+    what was read meanwhile from the old rows is not kept under the new one."""
+    keys = [_version_key(event_id) for event_id in set(event_ids)]
+    if not keys:
+        return
+
+    def touch():
+        cache.set_many({key: time.time_ns() for key in keys}, None)
+
+    touch()
+    if connection.in_atomic_block:
+        transaction.on_commit(touch)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def touch_role_event(sender, instance, **kwargs):
+    touch_events([instance.event_id])
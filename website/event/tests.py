@@ -1,9 +1,28 @@
+from datetime import datetime
+
+from django.db.models.signals import post_save
 from django.test import TestCase
+from organizer.models import EventWithSchedule
 
-from .models import Event
+from .models import Event, Role
 
 
 class EventModelTests(TestCase):
     def test_should_str_return_name(self):
         event = Event(name="toto")
         self.assertEqual(str(event), "toto")
+
+    def test_should_forget_grids_on_event_saves_only(self):
+        self.assertIs(post_save.has_listeners(Event), True)
+        self.assertIs(post_save.has_listeners(EventWithSchedule), True)
+
+        event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+        )
+        grid = event.schedule_grid()
+        Role.objects.create(name="bar", event=event)
+        self.assertIs(event.schedule_grid(), grid)
+        event.save()
+        self.assertIsNot(event.schedule_grid(), grid)
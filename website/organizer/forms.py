@@ -1,9 +1,11 @@
 import logging
 
 from django import forms
-from event.forms import EventBaseForm, RoleAndSlotBasedHiddenFormSet
+from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
+from event.forms import EventBaseForm
 
-from .models import EventSchedule, EventScheduleSlot
+from .models import EventSchedule
 
 logger = logging.getLogger(__name__)
 
@@ -14,25 +16,106 @@ class ScheduleEditForm(EventBaseForm):
     name = forms.CharField(required=False)
     no_delete = forms.BooleanField(required=False)
 
+    def schedule_fields(self):
+        """Return the fields of the saved schedule set by the form."""
+        if self.cleaned_data.get("as_base"):
+            fields = {"type": EventSchedule.ScheduleType.BASE}
+        else:
+            fields = {"type": EventSchedule.ScheduleType.USER}
+        fields["deletable"] = not self.cleaned_data.get("no_delete")
+        if self.cleaned_data["name"]:
+            fields["name"] = self.cleaned_data["name"]
+        return fields
 
-class ScheduleEventHiddenFormSet(
-    forms.inlineformset_factory(
-        EventSchedule,
-        EventScheduleSlot,
-        formset=RoleAndSlotBasedHiddenFormSet,
-        exclude=[],
-        widgets={
-            "volunteer": forms.HiddenInput(),
-            "start_date": forms.HiddenInput(),
-            "end_date": forms.HiddenInput(),
-            "role": forms.HiddenInput(),
-            "position": forms.HiddenInput(),
-            "fixed": forms.HiddenInput(),
-        },
-        extra=0,
-    )
-):
-    def __init__(self, *args, **kwargs):
+
+class ScheduleCellForm(forms.Form):
+    # a form not sent back by the browser keeps its cell as it is
+    cell = forms.CharField(required=False, widget=forms.HiddenInput())
+    volunteer = forms.IntegerField(required=False, widget=forms.HiddenInput())
+
+
+class BaseScheduleCellFormSet(forms.BaseFormSet):
+    def __init__(self, *args, schedule=None, cells=None, **kwargs):
+        self.schedule = schedule
+        self.cells = schedule.get_cells() if cells is None else cells
+        kwargs["initial"] = [
+            {
+                "cell": cell.key,
+                "volunteer": cell.volunteer.id if cell.volunteer else None,
+            }
+            for cell in self.cells
+        ]
         super().__init__(*args, **kwargs)
-        for f in self.forms:
-            f.fields["volunteer"].required = False
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.cell = self.cells[i] if i < len(self.cells) else None
+        return form
+
+    @cached_property
+    def forms_by_cell(self):
+        return {
+            (form.cell.role.id, form.cell.position, form.cell.slot): form
+            for form in self.forms
+            if form.cell is not None and form.cell.role is not None
+        }
+
+    @staticmethod
+    def _cell_key(index):
+        try:
+            role, slot = index
+            return (role[0].id, role[1], slot)
+        except (AttributeError, IndexError, TypeError, ValueError):
+            return None
+
+    def __getitem__(self, index):
+        key = self._cell_key(index)
+        if key is None:
+            return super().__getitem__(index)
+        return self.forms_by_cell[key]
+
+    def __contains__(self, index):
+        return self._cell_key(index) in self.forms_by_cell
+
+    def rows(self, roles, slots):
+        """Yield each (role, position) with its form by slot, None out of role."""
+        for role, position in roles:
+            yield (role, position), [
+                self.forms_by_cell.get((role.id, position, slot)) for slot in slots
+            ]
+
+    def clean(self):
+        if any(self.errors):
+            return
+        if self.total_form_count() != len(self.cells):
+            raise ValidationError(
+                "Le planning a été modifié entre temps, rechargez la page.",
+                code="outdated",
+            )
+        for form in self.forms:
+            key = form.cleaned_data.get("cell")
+            if not key:
+                continue
+            if form.cell is None or key != form.cell.key:
+                raise ValidationError(
+                    "Le planning a été modifié entre temps, rechargez la page.",
+                    code="outdated",
+                )
+        self.schedule.check_changes(self.get_changes())
+
+    def get_changes(self):
+        """Return the volunteer id, or None, of each cell changed by the forms."""
+        changes = {}
+        for form in self.forms:
+            cell = form.cell
+            if not form.cleaned_data.get("cell") or cell.role is None:
+                continue
+            volunteer = form.cleaned_data.get("volunteer")
+            if volunteer != (cell.volunteer.id if cell.volunteer else None):
+                changes[(cell.role.id, cell.position, cell.slot)] = volunteer
+        return changes
+
+
+ScheduleEventHiddenFormSet = forms.formset_factory(
+    ScheduleCellForm, formset=BaseScheduleCellFormSet, extra=0
+)
@@ -0,0 +1,163 @@
+import logging
+
+from common.fields import slots2mask
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.text import capfirst
+from event.models import event_version
+
+logger = logging.getLogger(__name__)
+
+TRASH = mark_safe(
+    '<a href="#" title="Désaffecter" class="ui-icon ui-icon-trash">Désaffecter</a>'
+)
+
+
+def volunteer_name(availability):
+    volunteer = availability.volunteer
+    return f"{volunteer.lastname.upper()} {capfirst(volunteer.firstname)}"
+
+
+def grid_etag(schedule):
+    """Version of the grid of a schedule, changed by its edits and by the
+    changes of the roles and volunteers of its event."""
+    return (
+        f'"{schedule.id}-{schedule.modified_at.timestamp()}-'
+        f'{event_version(schedule.event_id)}"'
+    )
+
+
+def event_volunteers(event):
+    return (
+        event.volunteeravailability_set.select_related("volunteer")
+        .prefetch_related("volunteerslot_set")
+        .order_by("volunteer__lastname", "volunteer__firstname", "volunteer_id")
+    )
+
+
+def grid_payload(event, slots, cells, volunteers):
+    """Compact grid of a schedule for the browser, slots, roles and volunteers
+    are listed once and the cells, given by (role id, position, slot,
+    volunteer id), reference them by index: [role, position, slot, volunteer
+    or null]. Cells out of ``slots`` are left out, volunteers out of
+    ``volunteers`` are null."""
+    roles = list(event.role_set.order_by("order", "id"))
+    volunteers = list(volunteers)
+    slot_index = {slot: idx for idx, slot in enumerate(slots)}
+    role_index = {role.id: idx for idx, role in enumerate(roles)}
+    volunteer_index = {volunteer.id: idx for idx, volunteer in enumerate(volunteers)}
+    return {
+        "slots": [str(slot) for slot in slots],
+        "roles": [[role.id, role.name, role.occurence] for role in roles],
+        "volunteers": [
+            [
+                volunteer.id,
+                volunteer_name(volunteer),
+                str(volunteer.volunteer.phonenumber or ""),
+                volunteer.notes or "",
+                slots2mask(volunteer.slots_in(slots), slots),
+            ]
+            for volunteer in volunteers
+        ],
+        "cells": sorted(
+            [
+                role_index[role],
+                position,
+                slot_index[slot],
+                volunteer_index.get(volunteer) if volunteer is not None else None,
+            ]
+            for role, position, slot, volunteer in cells
+            if role in role_index and slot in slot_index
+        ),
+    }
+
+
+def schedule_grid_payload(schedule, etag, window=None):
+    """Return the grid of a saved schedule, or of a window of it, cached by
+    version."""
+    key = "organizer:grid:" + etag.strip('"')
+    if window is not None:
+        key += ":" + window.query
+    payload = cache.get(key)
+    if payload is None:
+        grid = schedule.event.schedule_grid()
+        if window is None:
+            payload = grid_payload(
+                schedule.event,
+                grid,
+                schedule.snapshot().cells(),
+                event_volunteers(schedule.event),
+            )
+        else:
+            payload = grid_payload(
+                schedule.event,
+                window.slots,
+                [cell.values for cell in schedule.get_cells(grid, window.around)],
+                window.page.object_list,
+            )
+        cache.set(key, payload, getattr(settings, "SCHEDULE_SNAPSHOT_TIMEOUT", 3600))
+    return payload
+
+
+def _volunteer_div(availability, slot, name):
+    return format_html(
+        '<div class="volunteer-in-slot volunteer" data-schedule-volunteer-id="{}" '
+        'data-schedule-slot="{}">{} {}</div>',
+        availability.id,
+        slot,
+        name,
+        TRASH,
+    )
+
+
+def _hidden_input(form, name):
+    value = form[name].value()
+    html_name = form.add_prefix(name)
+    return format_html(
+        '<input type="hidden" name="{}" value="{}" id="id_{}">',
+        html_name,
+        "" if value is None else value,
+        html_name,
+    )
+
+
+def edit_rows_by_roles(formset, roles, grid):
+    """Return (role, position, cells) for the schedule table of the editor,
+    each cell holds the hidden inputs of its form."""
+    names = {}
+    rows = []
+    for (role, position), forms in formset.rows(roles, grid):
+        row = []
+        for form in forms:
+            if form is None:
+                row.append(mark_safe('<td class="slot-empty">&nbsp;</td>'))
+                continue
+            cell = form.cell
+            content = _hidden_input(form, "cell") + _hidden_input(form, "volunteer")
+            if form.errors:
+                content = form.errors.as_ul() + content
+            filled = form["volunteer"].value() not in (None, "")
+            if filled and cell.volunteer is not None:
+                if cell.volunteer not in names:
+                    names[cell.volunteer] = volunteer_name(cell.volunteer)
+                content += _volunteer_div(
+                    cell.volunteer, cell.slot, names[cell.volunteer]
+                )
+            row.append(
+                format_html(
+                    '<td class="slot-filled {} slot slot-schedule" '
+                    'data-schedule-slot="{}" data-schedule-role="{}-{}" '
+                    'data-schedule-role-name="{}-{}">{}</td>',
+                    "table-primary" if filled else "table-danger",
+                    cell.slot,
+                    role.id,
+                    position,
+                    role.name,
+                    position,
+                    content,
+                )
+            )
+        rows.append((role, position, row))
+    return rows
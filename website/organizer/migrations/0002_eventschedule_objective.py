@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizer", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventschedule",
+            name="objective",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+def merge_schedule_slots(apps, schema_editor):
+    EventScheduleSlot = apps.get_model("organizer", "EventScheduleSlot")
+
+    # consecutive slots of a role position with the same volunteer are one shift
+    merged = {}
+    to_delete = []
+    current = None
+    for row in EventScheduleSlot.objects.order_by(
+        "schedule_id", "role_id", "position", "start_date"
+    ).iterator():
+        if (
+            current is not None
+            and current.schedule_id == row.schedule_id
+            and current.role_id == row.role_id
+            and current.position == row.position
+            and current.volunteer_id == row.volunteer_id
+            and current.fixed == row.fixed
+            and current.end_date == row.start_date
+        ):
+            current.end_date = row.end_date
+            merged[current.id] = current
+            to_delete.append(row.id)
+            continue
+        current = row
+
+    EventScheduleSlot.objects.bulk_update(
+        merged.values(), ["end_date"], batch_size=1000
+    )
+    for idx in range(0, len(to_delete), 1000):
+        batch = to_delete[idx : idx + 1000]  # noqa: E203
+        EventScheduleSlot.objects.filter(id__in=batch).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizer", "0002_eventschedule_objective"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_schedule_slots, migrations.RunPython.noop),
+    ]
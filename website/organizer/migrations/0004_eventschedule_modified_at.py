@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 00:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizer", "0003_merge_schedule_slots"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventschedule",
+            name="modified_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("organizer", "0004_eventschedule_modified_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventschedule",
+            name="delta",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="eventschedule",
+            name="depth",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
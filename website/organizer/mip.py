@@ -0,0 +1,240 @@
+import logging
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+from pulp import (
+    PULP_CBC_CMD,
+    LpStatusInfeasible,
+    LpStatusNotSolved,
+    LpStatusOptimal,
+    LpStatusUnbounded,
+    LpStatusUndefined,
+)
+
+logger = logging.getLogger(__name__)
+
+CBC_STATUS = {
+    "Optimal": LpStatusOptimal,
+    "Infeasible": LpStatusInfeasible,
+    "Integer": LpStatusInfeasible,
+    "Unbounded": LpStatusUnbounded,
+    "Stopped": LpStatusNotSolved,
+}
+
+
+def tmp_directory():
+    # prefer a memory backed filesystem, models are written then read once
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+class Model:
+    """Binary minimisation model stored as index arrays.
+
+    Columns are binaries identified by their index, constraints are added by
+    blocks of coordinates (local row, column, coefficient) and kept as numpy
+    arrays until the model is compiled to CSR and written as MPS for CBC.
+    """
+
+    SENSES = ("L", "G", "E")
+
+    def __init__(self, name="event"):
+        self.name = name
+        self.cost = np.zeros(0)
+        self.lower = np.zeros(0)
+        self.upper = np.zeros(0)
+
+        self.nrows = 0
+        self._entries = []
+        self._senses = []
+        self._rhs = []
+
+        self.status = None
+        self.objective = None
+        self.solution = None
+
+    @property
+    def ncols(self):
+        return len(self.cost)
+
+    def add_columns(self, count, cost=0.0, lower=0.0, upper=1.0):
+        first = self.ncols
+        self.cost = np.concatenate([self.cost, np.broadcast_to(cost, count)])
+        self.lower = np.concatenate([self.lower, np.broadcast_to(lower, count)])
+        self.upper = np.concatenate([self.upper, np.broadcast_to(upper, count)])
+        return np.arange(first, first + count)
+
+    def add_rows(self, count, row, col, coef, sense, rhs):
+        """Add ``count`` rows, ``row`` being indices local to this block."""
+        if sense not in self.SENSES:
+            raise ValueError(f"Unknown sense {sense}")
+        first = self.nrows
+        row = np.asarray(row, dtype=np.int64)
+        self._entries.append(
+            (
+                row + first,
+                np.asarray(col, dtype=np.int64),
+                np.broadcast_to(np.asarray(coef, dtype=float), row.shape),
+            )
+        )
+        self._senses.append(np.full(count, sense))
+        self._rhs.append(np.broadcast_to(np.asarray(rhs, dtype=float), (count,)))
+        self.nrows += count
+        return np.arange(first, first + count)
+
+    def add_grouped_rows(self, key, col, coef, sense, rhs, skip_single=False):
+        """Add one row for each distinct ``key``, summing its columns."""
+        key = np.asarray(key)
+        if not len(key):
+            return np.zeros(0, dtype=np.int64)
+        groups, row, counts = np.unique(key, return_inverse=True, return_counts=True)
+        col = np.asarray(col)
+        coef = np.broadcast_to(np.asarray(coef, dtype=float), key.shape)
+        if skip_single:
+            keep = counts[row] > 1
+            groups, row = np.unique(row[keep], return_inverse=True)
+            col, coef = col[keep], coef[keep]
+        return self.add_rows(len(groups), row, col, coef, sense, rhs)
+
+    def to_csr(self):
+        if self._entries:
+            row = np.concatenate([e[0] for e in self._entries])
+            col = np.concatenate([e[1] for e in self._entries])
+            coef = np.concatenate([e[2] for e in self._entries])
+        else:
+            row = col = np.zeros(0, dtype=np.int64)
+            coef = np.zeros(0)
+
+        # sum duplicated coordinates, sorted by row then column
+        keys, inverse = np.unique(row * self.ncols + col, return_inverse=True)
+        data = np.bincount(inverse, weights=coef, minlength=len(keys))
+        indices = keys % max(self.ncols, 1)
+        indptr = np.zeros(self.nrows + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(keys // max(self.ncols, 1), minlength=self.nrows),
+            out=indptr[1:],
+        )
+        return indptr, indices, data
+
+    def senses(self):
+        if not self._senses:
+            return np.zeros(0, dtype="U1")
+        return np.concatenate(self._senses)
+
+    def rhs(self):
+        if not self._rhs:
+            return np.zeros(0)
+        return np.concatenate(self._rhs)
+
+    def write_mps(self, f):
+        indptr, indices, data = self.to_csr()
+        rows = np.repeat(np.arange(self.nrows), np.diff(indptr))
+
+        f.write(f"NAME {self.name}\nROWS\n N OBJ\n")
+        f.writelines(f" {sense} R{i}\n" for i, sense in enumerate(self.senses()))
+
+        # MPS is column oriented: walk the CSR entries sorted by column
+        order = np.argsort(indices, kind="stable")
+        rows, columns, data = rows[order], indices[order], data[order]
+        starts = np.searchsorted(columns, np.arange(self.ncols + 1))
+        f.write("COLUMNS\n    MARKER 'MARKER' 'INTORG'\n")
+        for j in range(self.ncols):
+            if self.cost[j]:
+                f.write(f"    C{j} OBJ {self.cost[j]:.12g}\n")
+            else:
+                f.write(f"    C{j} OBJ 0\n")
+            f.writelines(
+                f"    C{j} R{i} {value:.12g}\n"
+                for i, value in zip(
+                    rows[starts[j] : starts[j + 1]],  # noqa: E203
+                    data[starts[j] : starts[j + 1]],  # noqa: E203
+                )
+            )
+        f.write("    MARKER 'MARKER' 'INTEND'\n")
+
+        f.write("RHS\n")
+        f.writelines(
+            f"    RHS R{i} {value:.12g}\n"
+            for i, value in enumerate(self.rhs())
+            if value
+        )
+
+        f.write("BOUNDS\n")
+        for j in range(self.ncols):
+            if self.lower[j] == self.upper[j]:
+                f.write(f" FX BND C{j} {self.lower[j]:.12g}\n")
+            elif self.lower[j] == 0 and self.upper[j] == 1:
+                f.write(f" BV BND C{j}\n")
+            else:
+                f.write(f" LO BND C{j} {self.lower[j]:.12g}\n")
+                f.write(f" UP BND C{j} {self.upper[j]:.12g}\n")
+        f.write("ENDATA\n")
+
+    def write_start(self, f):
+        f.write("Stopped on time - objective value 0\n")
+        start = np.zeros(self.ncols)
+        values = self.solution[: self.ncols]
+        start[: len(values)] = values
+        f.writelines(f"{j:>7} C{j} {value:>15g} 0\n" for j, value in enumerate(start))
+
+    def read_solution(self, f):
+        line = f.readline()
+        header = line.split()
+        self.status = CBC_STATUS.get(header[0], LpStatusUndefined)
+        # stopped on time with an integer solution is used as it
+        feasible = (
+            self.status == LpStatusNotSolved
+            and "objective" in header
+            and "no integer solution" not in line
+        )
+        if feasible:
+            self.status = LpStatusOptimal
+        if self.status == LpStatusOptimal and "objective" in header:
+            self.objective = float(header[header.index("objective") + 2])
+
+        self.solution = np.zeros(self.ncols)
+        for line in f:
+            values = line.split()
+            if len(values) < 3:
+                break
+            if values[0] == "**":
+                values = values[1:]
+            if values[1].startswith("C"):
+                self.solution[int(values[1][1:])] = float(values[2])
+
+    def solve(self, time_limit=None, warm_start=False, directory=None):
+        with tempfile.TemporaryDirectory(dir=directory or tmp_directory()) as tmp:
+            mps = os.path.join(tmp, "model.mps")
+            start = os.path.join(tmp, "model.mst")
+            solution = os.path.join(tmp, "model.sol")
+
+            with open(mps, "w") as f:
+                self.write_mps(f)
+
+            args = [PULP_CBC_CMD().path, mps]
+            if warm_start and self.solution is not None:
+                with open(start, "w") as f:
+                    self.write_start(f)
+                args += ["-mips", start]
+            if time_limit is not None:
+                args += ["-sec", str(time_limit)]
+            args += ["-branch", "-printingOptions", "all", "-solution", solution]
+
+            logger.debug(f"Solve {self.ncols} columns x {self.nrows} rows")
+            subprocess.run(
+                args,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+
+            with open(solution) as f:
+                self.read_solution(f)
+        return self.status
+
+    def values(self, columns):
+        return self.solution[columns]
@@ -1,11 +1,16 @@
 import logging
 from datetime import timedelta
 
-from common.fields import Slot
-from django.db import models
-from django.db.models import Count, Q
+from common.fields import Slot, slot_grid, str2slot
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils.timezone import now
-from event.models import Role
+from event.models import Event, Role, event_version
 from volunteers.models import EventWithVolunteers, VolunteerAvailability
 
 logger = logging.getLogger(__name__)
@@ -20,11 +25,14 @@ class EventWithSchedule(EventWithVolunteers):
     def has_schedule_validated(self):
         return self.eventschedule_set.filter(validated_at__isnull=False).count() > 0
 
-    def schedule_slots(self):
-        return Slot.create_slots(
-            self.slot_duration_schedule, self.start_date, self.end_date
+    def schedule_grid(self):
+        return slot_grid(
+            self.pk, self.slot_duration_schedule, self.start_date, self.end_date
         )
 
+    def schedule_slots(self):
+        return list(self.schedule_grid())
+
 
 class EventSchedule(models.Model):
     class ScheduleType(models.TextChoices):
@@ -36,6 +44,7 @@ class EventSchedule(models.Model):
     event = models.ForeignKey(EventWithSchedule, on_delete=models.CASCADE, null=False)
     name = models.CharField(max_length=200, null=False, default="", blank=True)
     saved_at = models.DateTimeField(default=now, null=False)
+    # its delta versions are compacted before it is deleted
     based_on = models.ForeignKey(
         "self", on_delete=models.SET_NULL, null=True, blank=True
     )
@@ -44,6 +53,13 @@ class EventSchedule(models.Model):
     )
     deletable = models.BooleanField(default=True, null=False)
     validated_at = models.DateTimeField(null=True, blank=True)
+    # objective value of a generated schedule, lower is better
+    objective = models.FloatField(null=True, blank=True)
+    # bumped on each save, a new version of the cached snapshot
+    modified_at = models.DateTimeField(default=now, null=False)
+    # only the cells differing from based_on are stored, depth deltas deep
+    delta = models.BooleanField(default=False, null=False)
+    depth = models.PositiveIntegerField(default=0, null=False)
 
     def __str__(self):
         if self.name:
@@ -54,106 +70,531 @@ class EventSchedule(models.Model):
     def can_delete(self):
         return self.validated_at is None and self.deletable
 
-    def get_missing_by_slots(self):
-        return {
-            Slot(r["start_date"], r["end_date"]): r["total"]
-            for r in self.eventscheduleslot_set.filter(
-                Q(role__isnull=True) | Q(volunteer__isnull=True)
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            cache.delete(ScheduleSnapshot.cache_key(self))
+        self.modified_at = now()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {"modified_at", *kwargs["update_fields"]}
+        super().save(*args, **kwargs)
+
+    def snapshot(self):
+        key = ScheduleSnapshot.cache_key(self)
+        snapshot = cache.get(key)
+        if snapshot is None:
+            snapshot = ScheduleSnapshot(self)
+            cache.set(
+                key, snapshot, getattr(settings, "SCHEDULE_SNAPSHOT_TIMEOUT", 3600)
             )
-            .values("start_date", "end_date")
-            .annotate(total=Count("start_date"))
-            .order_by("start_date")
-        }
+        return snapshot
 
-    def get_schedule_by_roles(self):
-        slots = (
-            self.eventscheduleslot_set.prefetch_related(
-                "role", "volunteer", "volunteer__volunteer"
-            )
-            .filter(role__isnull=False)
-            .order_by("start_date")
+    @property
+    def is_delta(self):
+        return self.delta and self.based_on_id is not None
+
+    def get_cells(self, grid=None, around=None):
+        """Expand the stored shifts to one cell by role position and grid slot.
+
+        The cells of a delta schedule are resolved through its ``based_on``
+        chain, ``around`` filters the shifts read at each level."""
+        if grid is None:
+            grid = self.event.schedule_grid()
+        shifts = self.eventscheduleslot_set.select_related(
+            "role", "volunteer", "volunteer__volunteer"
+        ).order_by("role__order", "role_id", "position", "start_date")
+        if around is not None:
+            shifts = shifts.filter(around)
+        own = ScheduleCell.from_shifts(shifts, grid)
+        if not self.is_delta:
+            return own
+        cells = {cell.ident: cell for cell in self.based_on.get_cells(grid, around)}
+        cells.update((cell.ident, cell) for cell in own)
+        return list(cells.values())
+
+    def clone(self, **fields):
+        """Copy the schedule, with ``fields`` changed, and its shifts.
+
+        The shifts are copied by the database in one INSERT ... SELECT, a
+        delta schedule is copied as another version of its ``based_on``."""
+        copy = EventSchedule(
+            event_id=self.event_id,
+            name=self.name,
+            based_on_id=self.based_on_id,
+            type=self.type,
+            deletable=self.deletable,
+            objective=self.objective,
+            delta=self.delta,
+            depth=self.depth,
         )
-
-        schedule = {(slot.role.order, slot.position, slot.role): {} for slot in slots}
-        for slot in slots:
-            schedule[(slot.role.order, slot.position, slot.role)][slot.slot] = {
-                "volunteer": slot.volunteer
+        for name, value in fields.items():
+            setattr(copy, name, value)
+        with transaction.atomic():
+            copy.save()
+            self._copy_shifts(copy)
+        return copy
+
+    def _copy_shifts(self, target, shifts=None):
+        # INSERT ... SELECT of the shifts, all by default, with the identifiers
+        # quoted and the values passed as parameters of the compiled SELECT
+        if shifts is None:
+            shifts = self.eventscheduleslot_set.all()
+        fields = [
+            field
+            for field in EventScheduleSlot._meta.concrete_fields
+            if not field.primary_key and field.name != "schedule"
+        ]
+        select = (
+            shifts.order_by()
+            .annotate(target_id=Value(target.pk, output_field=models.IntegerField()))
+            .values_list(*(field.attname for field in fields), "target_id")
+        )
+        sql, params = select.query.sql_with_params()
+        quote = connection.ops.quote_name
+        insert = "INSERT INTO {} ({}) ".format(
+            quote(EventScheduleSlot._meta.db_table),
+            ", ".join(
+                quote(column)
+                for column in [field.column for field in fields] + ["schedule_id"]
+            ),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(insert + sql, params)
+
+    def branch(self, **fields):
+        """Create a version of the schedule, with ``fields`` changed, storing
+        only the cells changed from it.
+
+        Past SCHEDULE_DELTA_MAX_DEPTH versions, the new one is compacted."""
+        version = EventSchedule(
+            event_id=self.event_id,
+            name=self.name,
+            based_on=self,
+            type=self.type,
+            deletable=self.deletable,
+            objective=self.objective,
+            delta=True,
+            depth=self.depth + 1 if self.is_delta else 1,
+        )
+        for name, value in fields.items():
+            setattr(version, name, value)
+        with transaction.atomic():
+            version.save()
+            if version.depth > getattr(settings, "SCHEDULE_DELTA_MAX_DEPTH", 5):
+                version.compact()
+        return version
+
+    def compact(self):
+        """Store all the cells of a delta schedule, detached from its parent.
+
+        Over a full parent, its shifts away from the changed cells are copied
+        by the database, only the ones touching them are merged here."""
+        if not self.is_delta:
+            return
+        if self.based_on.is_delta:
+            self._store(self.get_cells())
+            return
+        grid = self.event.schedule_grid()
+        changed = self.eventscheduleslot_set.filter(
+            role_id=OuterRef("role_id"),
+            position=OuterRef("position"),
+            start_date__lte=OuterRef("end_date"),
+            end_date__gte=OuterRef("start_date"),
+        )
+        parent = self.based_on.eventscheduleslot_set.annotate(changed=Exists(changed))
+        with transaction.atomic():
+            own = list(self.eventscheduleslot_set.select_related("role", "volunteer"))
+            cells = {
+                cell.ident: cell
+                for cell in ScheduleCell.from_shifts(
+                    parent.filter(changed=True).select_related("role", "volunteer"),
+                    grid,
+                )
             }
-
-        schedule = dict(
-            sorted([(k, dict(sorted(v.items()))) for k, v in schedule.items()])
+            cells.update(
+                (cell.ident, cell) for cell in ScheduleCell.from_shifts(own, grid)
+            )
+            self.based_on._copy_shifts(self, parent.filter(changed=False))
+            EventScheduleSlot.objects.filter(id__in=[s.id for s in own]).delete()
+            EventScheduleSlot.objects.bulk_create(
+                EventScheduleSlot.from_cells(self, cells.values())
+            )
+            self.delta = False
+            self.depth = 0
+            self.save(update_fields=["delta", "depth"])
+
+    def detach_children(self):
+        """Compact the delta versions based on this schedule, to change or
+        delete it."""
+        for child in EventSchedule.objects.filter(based_on=self, delta=True):
+            child.compact()
+
+    @staticmethod
+    def detach_versions(schedules, purged=None):
+        """Compact and unlink the versions based on the ``schedules``
+        queryset, which is about to be deleted, except the deleted ones.
+
+        The versions also in the ``purged`` queryset are only unlinked."""
+        children = EventSchedule.objects.filter(based_on__in=schedules).exclude(
+            pk__in=schedules
         )
+        compacted = children.filter(delta=True)
+        if purged is not None:
+            compacted = compacted.exclude(pk__in=purged)
+        for child in compacted:
+            child.compact()
+        children.update(based_on=None)
+
+    @staticmethod
+    def purge(schedules, chunk_size=None):
+        """Delete the ``schedules`` queryset and their shifts, by chunks with
+        the shifts in single DELETEs, and return the number of rows removed."""
+        if chunk_size is None:
+            chunk_size = getattr(settings, "SCHEDULE_PURGE_CHUNK_SIZE", 5000)
+        removed = {"schedules": 0, "shifts": 0}
+        while True:
+            with transaction.atomic():
+                ids = list(schedules.values_list("pk", flat=True)[:chunk_size])
+                if not ids:
+                    return removed
+                EventSchedule.detach_versions(
+                    EventSchedule.objects.filter(pk__in=ids), schedules
+                )
+                while True:
+                    shift_ids = list(
+                        EventScheduleSlot.objects.filter(
+                            schedule_id__in=ids
+                        ).values_list("pk", flat=True)[:chunk_size]
+                    )
+                    if not shift_ids:
+                        break
+                    # no cascade nor signal to go through, a single DELETE
+                    removed["shifts"] += EventScheduleSlot.objects.filter(
+                        pk__in=shift_ids
+                    ).delete()[0]
+                _, deleted = EventSchedule.objects.filter(pk__in=ids).delete()
+                removed["schedules"] += deleted.get("organizer.EventSchedule", 0)
+
+    def set_cells(self, cells):
+        with transaction.atomic():
+            self.detach_children()
+            self._store(cells)
+
+    def _store(self, cells):
+        self.eventscheduleslot_set.all().delete()
+        EventScheduleSlot.objects.bulk_create(EventScheduleSlot.from_cells(self, cells))
+        self.delta = False
+        self.depth = 0
+        self.save(update_fields=["delta", "depth"])
+
+    def apply_changes(self, changes):
+        """Set the volunteer, or None, of some cells given by
+        (role id, position, slot) and return the changed cells.
+
+        Only the shifts around the changed cells are read and rewritten, a
+        delta schedule drops the cells back to their based_on value."""
+        if not changes:
+            return []
+        grid = self.event.schedule_grid()
+        around = Q()
+        for role_id, position, slot in changes:
+            if slot not in grid.index:
+                raise ValidationError("Créneau inconnu.", code="invalid")
+            # touching shifts too, to merge them with the changed cells
+            around |= Q(
+                role_id=role_id,
+                position=position,
+                start_date__lte=slot.end,
+                end_date__gte=slot.start,
+            )
 
-        for role, volunteers in schedule.items():
-            slots = [k for k in volunteers.keys()]
-
-            while slots:
-                slot = slots.pop(0)
-                grouped = [slot]
-                nb = 1
-                while slots and volunteers[slot] == volunteers[slots[0]]:
-                    grouped.append(slots.pop(0))
-                    nb += 1
-                for s in grouped:
-                    volunteers[s]["nb"] = nb
-                    volunteers[s]["first"] = slot
-
-        return schedule
-
-    # TODO simplify, too complex
-    def get_schedule_by_volunteers(self):
-        slots = (
-            self.eventscheduleslot_set.prefetch_related(
-                "role", "volunteer", "volunteer__volunteer"
+        with transaction.atomic():
+            self.detach_children()
+            shifts = list(
+                self.eventscheduleslot_set.select_for_update()
+                .select_related("role", "volunteer")
+                .filter(around)
             )
-            .filter(role__isnull=False, volunteer__isnull=False)
-            .order_by("start_date")
-        )
+            own = {cell.ident: cell for cell in ScheduleCell.from_shifts(shifts, grid)}
+            inherited = {}
+            if self.is_delta:
+                inherited = {
+                    cell.ident: cell for cell in self.based_on.get_cells(grid, around)
+                }
+            cells = inherited | own
+            if any(cell not in cells for cell in changes):
+                raise ValidationError(
+                    "Le planning a été modifié entre temps, rechargez la page.",
+                    code="outdated",
+                )
+
+            volunteers = self.check_changes(changes, grid)
+            changed = []
+            for key, volunteer in changes.items():
+                cell = cells[key]
+                cell = ScheduleCell(
+                    cell.role,
+                    cell.position,
+                    cell.slot,
+                    volunteers.get(volunteer),
+                    cell.fixed,
+                )
+                changed.append(cell)
+                if key in inherited and inherited[key].volunteer == cell.volunteer:
+                    own.pop(key, None)
+                else:
+                    own[key] = cell
+
+            EventScheduleSlot.objects.filter(id__in=[s.id for s in shifts]).delete()
+            EventScheduleSlot.objects.bulk_create(
+                EventScheduleSlot.from_cells(self, own.values())
+            )
+            self.save(update_fields=["modified_at"])
+        return changed
+
+    def check_changes(self, changes, grid=None):
+        """Check the availability and double booking of the assigned
+        volunteers and return them by id."""
+        if grid is None:
+            grid = self.event.schedule_grid()
+        if not changes:
+            return {}
+        assigned = {v for v in changes.values() if v is not None}
+        volunteers = {
+            v.id: v
+            for v in self.event.volunteeravailability_set.filter(
+                id__in=assigned
+            ).prefetch_related("volunteerslot_set")
+        }
+        if len(volunteers) != len(assigned):
+            raise ValidationError("Bénévole inconnu.", code="invalid")
+        for (_, _, slot), volunteer in changes.items():
+            if volunteer is not None and slot not in volunteers[volunteer].availability:
+                raise ValidationError(
+                    f"{volunteers[volunteer]} n'est pas disponible sur {slot}.",
+                    code="unavailable",
+                )
+
+        busy = self._busy(grid, changes, assigned)
+        for (_, _, slot), volunteer in changes.items():
+            if volunteer is None:
+                continue
+            if (volunteer, slot) in busy:
+                raise ValidationError(
+                    f"{volunteers[volunteer]} est déjà affecté sur {slot}.",
+                    code="booked",
+                )
+            busy[(volunteer, slot)] = True
+        return volunteers
+
+    def _busy(self, grid, changes, volunteers):
+        # (volunteer, slot) assigned out of the changed cells, around them
+        if self.pk is None:
+            return {}
+        slots = [slot for (_, _, slot) in changes]
+        around = Q(start_date__lt=max(slots).end, end_date__gt=min(slots).start)
+        if self.is_delta:
+            # an inherited assignment can be overridden by any volunteer
+            assigned = [
+                (cell.ident, cell.volunteer.id)
+                for cell in self.get_cells(grid, around)
+                if cell.role is not None and cell.volunteer is not None
+            ]
+        else:
+            assigned = [
+                ((shift.role_id, shift.position, slot), shift.volunteer_id)
+                for shift in self.eventscheduleslot_set.filter(
+                    around, volunteer_id__in=volunteers, role__isnull=False
+                )
+                for slot in grid.within(shift.slot)
+            ]
+        return {
+            (volunteer, key[2]): True
+            for key, volunteer in assigned
+            if key not in changes
+        }
 
-        volunteers = self.event.volunteeravailability_set.all()
-        schedule = {volunteer: {} for volunteer in volunteers}
-        for slot in slots:
-            schedule[slot.volunteer][slot.slot] = {
-                "role": slot.role,
-                "position": slot.position,
-                "available": True,
-            }
+    def get_missing_by_slots(self, cells=None):
+        missing = {}
+        for cell in self.get_cells() if cells is None else cells:
+            if cell.role is None or cell.volunteer is None:
+                missing[cell.slot] = missing.get(cell.slot, 0) + 1
+        return dict(sorted(missing.items()))
+
+    def get_schedule_by_roles(self, cells=None):
+        grid = self.event.schedule_grid()
+        rows = {}
+        for cell in self.get_cells(grid) if cells is None else cells:
+            if cell.role is not None:
+                key = (cell.role.order, cell.position, cell.role)
+                rows.setdefault(key, {})[grid.index[cell.slot]] = {
+                    "volunteer": cell.volunteer
+                }
+
+        return {
+            key: _group_runs(grid, rows[key])
+            for key in sorted(rows, key=lambda k: (k[0], k[1], k[2].id))
+        }
+
+    def get_schedule_by_volunteers(self, cells=None):
+        grid = self.event.schedule_grid()
+        volunteers = sorted(
+            self.event.volunteeravailability_set.select_related(
+                "volunteer"
+            ).prefetch_related("volunteerslot_set"),
+            key=lambda v: (v.volunteer.lastname, v.volunteer.firstname, v.volunteer_id),
+        )
+        rows = {volunteer.id: {} for volunteer in volunteers}
+        for cell in self.get_cells(grid) if cells is None else cells:
+            if cell.role is not None and cell.volunteer is not None:
+                rows[cell.volunteer.id][grid.index[cell.slot]] = {
+                    "role": cell.role,
+                    "position": cell.position,
+                    "available": True,
+                }
 
         for volunteer in volunteers:
-            volunteer_slots = volunteer.volunteerslot_set.all()
-            for slot in self.event.schedule_slots():
-                if any([slot.is_contained_by(vs.slot) for vs in volunteer_slots]):
-                    try:
-                        schedule[volunteer][slot]["availability"] = True
-                    except KeyError:
-                        schedule[volunteer][slot] = {"availability": True}
-
-        schedule = dict(
-            sorted([(k, dict(sorted(v.items()))) for k, v in schedule.items()])
+            entries = rows[volunteer.id]
+            for available in volunteer.availability:
+                for slot in grid.within(available):
+                    entries.setdefault(grid.index[slot], {})["availability"] = True
+
+        return {
+            volunteer: _group_runs(grid, rows[volunteer.id]) for volunteer in volunteers
+        }
+
+
+def _group_runs(grid, entries):
+    """Key entries by slot, each one tagged with the length and first slot of
+    its run of equal entries on contiguous grid indexes."""
+    runs = []
+    for idx in sorted(entries):
+        if runs and runs[-1][-1] == idx - 1 and entries[runs[-1][-1]] == entries[idx]:
+            runs[-1].append(idx)
+        else:
+            runs.append([idx])
+
+    result = {}
+    for run in runs:
+        for idx in run:
+            entries[idx]["nb"] = len(run)
+            entries[idx]["first"] = grid[run[0]]
+            result[grid[idx]] = entries[idx]
+    return result
+
+
+class ScheduleSnapshot:
+    # read only projections of one schedule version, shared through the cache
+    # as ids, slots and names: model rows would be stale once edited
+    __slots__ = (
+        "schedule_id",
+        "modified_at",
+        "missings",
+        "by_roles",
+        "by_volunteers",
+    )
+
+    def __init__(self, schedule):
+        self.schedule_id = schedule.pk
+        self.modified_at = schedule.modified_at
+        # the cells are read once for the three projections
+        cells = schedule.get_cells()
+        self.missings = schedule.get_missing_by_slots(cells)
+        self.by_roles = [
+            {
+                "role": role.id,
+                "name": role.name,
+                "position": position,
+                "slots": {
+                    slot: entry | {"volunteer": _pk(entry["volunteer"])}
+                    for slot, entry in runs.items()
+                },
+            }
+            for (_, position, role), runs in schedule.get_schedule_by_roles(
+                cells
+            ).items()
+        ]
+        self.by_volunteers = [
+            {
+                "volunteer": volunteer.id,
+                "name": str(volunteer.volunteer),
+                "slots": {
+                    slot: (
+                        entry | {"role": entry["role"].id} if "role" in entry else entry
+                    )
+                    for slot, entry in runs.items()
+                },
+            }
+            for volunteer, runs in schedule.get_schedule_by_volunteers(cells).items()
+        ]
+
+    def cells(self):
+        """Return the (role id, position, slot, volunteer id) of the cells."""
+        return [
+            (row["role"], row["position"], slot, entry["volunteer"])
+            for row in self.by_roles
+            for slot, entry in row["slots"].items()
+        ]
+
+    @staticmethod
+    def cache_key(schedule):
+        # the event version follows the roles, volunteers and availabilities
+        return (
+            f"organizer:schedule:{schedule.pk}:{schedule.modified_at.timestamp()}:"
+            f"{event_version(schedule.event_id)}"
         )
 
-        for volunteer, roles in schedule.items():
-            slots = [k for k in roles.keys()]
 
-            while slots:
-                slot = slots.pop(0)
-                grouped = [slot]
-                nb = 1
-                while (
-                    slots
-                    and roles[slot] == roles[slots[0]]
-                    and slots[0].start == grouped[-1].end
-                ):
-                    grouped.append(slots.pop(0))
-                    nb += 1
-                for s in grouped:
-                    roles[s]["nb"] = nb
-                    roles[s]["first"] = slot
+def _pk(instance):
+    return instance.pk if instance is not None else None
 
-        return schedule
+
+class ScheduleCell:
+    # one grid slot of a role position, as seen by the edit grid and formsets
+    __slots__ = ("role", "position", "slot", "volunteer", "fixed")
+
+    def __init__(self, role, position, slot, volunteer=None, fixed=False):
+        self.role = role
+        self.position = position
+        self.slot = slot
+        self.volunteer = volunteer
+        self.fixed = fixed
+
+    @property
+    def key(self):
+        return f"{self.role.id if self.role else ''}-{self.position}-{self.slot}"
+
+    @property
+    def ident(self):
+        return (self.role.id if self.role else None, self.position, self.slot)
+
+    @property
+    def values(self):
+        return (*self.ident, self.volunteer.id if self.volunteer else None)
+
+    @staticmethod
+    def from_shifts(shifts, grid):
+        return [
+            ScheduleCell(shift.role, shift.position, slot, shift.volunteer, shift.fixed)
+            for shift in shifts
+            for slot in grid.within(shift.slot)
+        ]
+
+    @staticmethod
+    def parse_key(key):
+        """Return the (role id, position, slot) of a cell key."""
+        try:
+            role_id, position, slot = key.split("-", 2)
+            return int(role_id), int(position), str2slot(slot)
+        except (AttributeError, ValueError):
+            raise ValidationError("Créneau inconnu.", code="invalid")
+
+    def __repr__(self):
+        return f"{self.key}: {self.volunteer}"
 
 
 class EventScheduleSlot(models.Model):
+    # a shift: a role position held by the same volunteer, or by nobody, on
+    # consecutive slots of the grid
     schedule = models.ForeignKey(EventSchedule, on_delete=models.CASCADE, null=False)
     volunteer = models.ForeignKey(
         VolunteerAvailability, on_delete=models.SET_NULL, null=True, blank=True
@@ -168,6 +609,36 @@ class EventScheduleSlot(models.Model):
     def slot(self):
         return Slot(self.start_date, self.end_date)
 
+    @staticmethod
+    def from_cells(schedule, cells):
+        shifts = []
+        for cell in sorted(
+            cells, key=lambda c: (c.role.id if c.role else 0, c.position, c.slot)
+        ):
+            last = shifts[-1] if shifts else None
+            if (
+                last is not None
+                and last.role == cell.role
+                and last.position == cell.position
+                and last.volunteer == cell.volunteer
+                and last.fixed == cell.fixed
+                and last.end_date == cell.slot.start
+            ):
+                last.end_date = cell.slot.end
+                continue
+            shifts.append(
+                EventScheduleSlot(
+                    schedule=schedule,
+                    role=cell.role,
+                    position=cell.position,
+                    volunteer=cell.volunteer,
+                    fixed=cell.fixed,
+                    start_date=cell.slot.start,
+                    end_date=cell.slot.end,
+                )
+            )
+        return shifts
+
     def __str__(self):
         return (
             f"{str(self.schedule)} - "
@@ -176,6 +647,47 @@ class EventScheduleSlot(models.Model):
         )
 
 
+@receiver(pre_delete, sender=EventSchedule)
+def detach_deleted_versions(sender, instance, origin=None, **kwargs):
+    # every delete path, admin and Event cascade included, compacts the
+    # versions of the deleted schedules, once for all the deleted ones
+    if getattr(origin, "_versions_detached", False):
+        return
+    if isinstance(origin, models.QuerySet) and issubclass(origin.model, Event):
+        schedules = EventSchedule.objects.filter(event_id__in=origin.values("pk"))
+    elif isinstance(origin, models.QuerySet) and origin.model is EventSchedule:
+        schedules = origin
+    elif isinstance(origin, Event):
+        schedules = EventSchedule.objects.filter(event_id=origin.pk)
+    else:
+        schedules = EventSchedule.objects.filter(pk=instance.pk)
+    EventSchedule.detach_versions(schedules)
+    if origin is not None:
+        origin._versions_detached = True
+
+
+@receiver(pre_delete, sender=VolunteerAvailability)
+@receiver(pre_delete, sender=Role)
+def touch_nulled_schedules(sender, instance, origin=None, **kwargs):
+    # the shifts keep a null volunteer or role, the schedules holding them
+    # get a new version, once for all the deleted rows
+    if getattr(origin, "_schedules_touched", False):
+        return
+    if isinstance(origin, Event) or (
+        isinstance(origin, models.QuerySet) and issubclass(origin.model, Event)
+    ):
+        # deleted with their event
+        return
+    field = "volunteer" if sender is VolunteerAvailability else "role"
+    if isinstance(origin, models.QuerySet) and origin.model is sender:
+        nulled = {f"eventscheduleslot__{field}__in": origin}
+    else:
+        nulled = {f"eventscheduleslot__{field}": instance}
+    EventSchedule.objects.filter(**nulled).update(modified_at=now())
+    if origin is not None:
+        origin._schedules_touched = True
+
+
 class ScheduleEventRemainder(models.Model):
     event = models.ForeignKey(EventWithSchedule, on_delete=models.CASCADE, null=False)
     days_before = models.IntegerField(null=False, default=15)
@@ -1,20 +1,21 @@
 import logging
+from collections import namedtuple
+from datetime import timedelta
 from enum import Enum
 
-from pulp import (
-    PULP_CBC_CMD,
-    LpMinimize,
-    LpProblem,
-    LpStatus,
-    LpStatusOptimal,
-    LpVariable,
-    lpSum,
-    value,
-)
+import numpy as np
+from common.fields import IntervalSet
+from django.conf import settings
+from pulp import LpStatus, LpStatusOptimal
+
+from .mip import Model
 
 logger = logging.getLogger(__name__)
 
 
+Solution = namedtuple("Solution", ["schedule", "missing", "objective"])
+
+
 class FriendMode(Enum):
     STRICT = 1
     AT_BEST = 2
@@ -22,13 +23,25 @@ class FriendMode(Enum):
 
 
 class Scheduler:
-    def __init__(self, event, base=None):
+    def __init__(self, event, base=None, horizon=None, overlap=None, pool_size=None):
         self.event = event
         self.base = base
-        self.slots = event.schedule_slots()
+        # solve window by window when an horizon is given, None is all at once
+        self.horizon = horizon or getattr(settings, "SCHEDULER_HORIZON", None)
+        self.overlap = (
+            overlap
+            if overlap is not None
+            else getattr(settings, "SCHEDULER_OVERLAP", timedelta(hours=2))
+        )
+        # alternative schedules, each one differing from the previous ones
+        self.pool_size = pool_size or getattr(settings, "SCHEDULER_POOL_SIZE", 1)
+        self.diversity = getattr(settings, "SCHEDULER_POOL_DIVERSITY", 0.1)
+        grid = event.schedule_grid()
+        self.slots = grid.slots
+        self._slot_index = grid.index
 
         self.unduplicated_roles = {
-            role: [slot for slot in self.slots if slot.is_contained_by(role.slot)]
+            role: IntervalSet([role.slot]).covered(self.slots)
             for role in event.role_set.all()
         }
         self.roles = {
@@ -36,19 +49,36 @@ class Scheduler:
             for role, slots in self.unduplicated_roles.items()
             for idx in range(0, role.occurence)
         }
+        self._role_keys = list(self.roles.keys())
+        self._role_index = {r: idx for idx, r in enumerate(self._role_keys)}
         logger.debug(self.roles)
 
-        self.volunteers = event.volunteeravailability_set.prefetch_related(
-            "friend", "volunteerslot_set"
-        ).all()
+        self.volunteers = list(
+            event.volunteeravailability_set.prefetch_related(
+                "friend", "volunteerslot_set", "categories"
+            ).all()
+        )
+        self._volunteer_index = {v: idx for idx, v in enumerate(self.volunteers)}
+
+        # volunteer x slot, role x slot and volunteer x role masks
+        self.availabilities = np.zeros((len(self.volunteers), len(self.slots)), bool)
+        for v, volunteer in enumerate(self.volunteers):
+            self.availabilities[v] = volunteer.availability.mask(self.slots)
+        self.needs = np.zeros((len(self._role_keys), len(self.slots)), bool)
+        for r, needs in enumerate(self.roles.values()):
+            self.needs[r, [self._slot_index[slot] for slot in needs]] = True
+        self.allowed = np.zeros((len(self.volunteers), len(self._role_keys)), bool)
+        for v, volunteer in enumerate(self.volunteers):
+            for r, role in enumerate(self._role_keys):
+                self.allowed[v, r] = self._can_take(volunteer, role[0])
 
         self.fixed_slots = []
         if base is not None:
-            self.fixed_slots = (
-                self.base.eventscheduleslot_set.filter(volunteer__isnull=False)
-                .prefetch_related("volunteer", "role")
-                .all()
-            )
+            self.fixed_slots = [
+                cell
+                for cell in self.base.get_cells(grid)
+                if cell.volunteer is not None and cell.role is not None
+            ]
 
         self.problem = None
         self._friend_mode = FriendMode.STRICT
@@ -60,21 +90,37 @@ class Scheduler:
                 continue
             if v.friend and v.friend.friend and v.friend.friend == v:
                 logger.debug(f"Set {v} and {v.friend} as friends")
-                common_availabilities = set(v.slots).intersection(set(v.friend.slots))
-                common_slots = [
-                    slot
-                    for slot in self.slots
-                    if any(
-                        slot.is_contained_by(availability)
-                        for availability in common_availabilities
-                    )
-                ]
+                common_slots = (v.availability & v.friend.availability).covered(
+                    self.slots
+                )
                 logger.debug(f"Friendship common slots: {common_slots}")
 
                 friend_done.add(v)
                 friend_done.add(v.friend)
                 self.friendship[(v, v.friend)] = common_slots
 
+        self.shifts = self._shift_lengths()
+
+    def _can_take(self, volunteer, role):
+        categories = volunteer.categories.all()
+        return not categories or role.category is None or role.category in categories
+
+    def _shift_lengths(self):
+        duration = self.event.slot_duration_schedule
+        lengths = {}
+        for r, (role, position) in enumerate(self._role_keys):
+            role_lengths = sorted(
+                {
+                    length // duration
+                    for length in role.shift_durations
+                    if length % duration == timedelta(0)
+                    and length // duration <= len(self.slots)
+                }
+            )
+            if role_lengths:
+                lengths[r] = role_lengths
+        return lengths
+
     @property
     def friend_mode(self):
         return self._friend_mode
@@ -89,221 +135,402 @@ class Scheduler:
     def is_valid(self):
         if self.problem is None:
             self._schedule()
-        return self.problem is not None and self.problem.status == LpStatusOptimal
+        return bool(self._solutions)
+
+    @property
+    def solutions(self):
+        if not self.is_valid:
+            return []
+        return self._solutions
 
     @property
     def schedule(self):
         if not self.is_valid:
             return {}
-        return self._scheduled
+        return self._solutions[0].schedule
 
     @property
     def missing(self):
         if not self.is_valid:
             return []
-        return self._missing
+        return self._solutions[0].missing
+
+    @property
+    def objective(self):
+        if not self.is_valid:
+            return None
+        return self._solutions[0].objective
+
+    def _windows(self):
+        S = len(self.slots)
+        if not self.horizon:
+            return [(0, S, S)]
+
+        duration = self.event.slot_duration_schedule
+        size = max(self.horizon // duration, 1)
+        step = max(size - self.overlap // duration, 1)
+        windows = []
+        low = 0
+        while low + size < S:
+            windows.append((low, low + step, low + size))
+            low += step
+        windows.append((low, S, S))
+        return windows
 
-    # TODO simplify, too complex
     def _schedule(self):
-        self.problem = LpProblem("event", LpMinimize)
+        self._weights = np.array([r[0].weight for r in self._role_keys], float)
+        self._solutions = []
+        self._cuts = []
+        for _ in range(self.pool_size):
+            if not self._schedule_windows():
+                break
+            self._solutions.append(self._extract())
+            self._cuts.append(self._committed[:3])
+            logger.debug(f"Solution {len(self._solutions)}: {self._solutions[-1][2]}")
+
+    def _schedule_windows(self):
+        V, R = len(self.volunteers), len(self._role_keys)
+
+        # state carried from a window to the next one
+        self._committed = tuple(np.zeros(0, np.int64) for _ in range(4))
+        self._places = np.zeros((V, R), bool)
+        self._pairing = set()
+
+        for low, commit, high in self._windows():
+            logger.debug(f"Schedule slots {low} to {high}, commit up to {commit}")
+            self._solve_window(low, commit, high)
+            if self.problem.status != LpStatusOptimal:
+                return False
+            self._commit(low, commit)
+        return True
+
+    def _solve_window(self, low, commit, high):
+        self.problem = Model(f"event-{low}")
+        self._window = (low, high)
+        self._build(low, high)
+        for cut in self._cuts:
+            self._add_cut(cut, low, commit)
+
+        # strict friendship rows are only generated when a pair is split, the
+        # ones found on the overlap of the previous window are added upfront
+        self._friendship_rows = set()
+        self._friendship_cols = {}
+        carried = [
+            key for key in self._pairing if low <= self._slot_index[key[2]] < high
+        ]
+        if carried:
+            self._add_friendships(carried)
+        # the reward of AT_BEST is an objective term, the solver must see it
+        # on every role the pair could share
+        if self._friend_mode == FriendMode.AT_BEST:
+            self._add_friendships(self._shared_roles())
 
-        choices = LpVariable.dicts(
-            "Choice", (self.volunteers, self.roles.keys(), self.slots), cat="Binary"
+        # no start from the previous solution of the pool, it breaks its cut
+        self.problem.solve(time_limit=120)
+        while self.problem.status == LpStatusOptimal:
+            split = self._split_friends()
+            if not split:
+                break
+            logger.debug(f"Add {len(split)} friendship rows")
+            self._add_friendships(split)
+            self.problem.solve(time_limit=120, warm_start=True)
+
+        logger.debug(f"Status:{LpStatus[self.problem.status]}")
+        self._pairing.update(self._friendship_rows)
+        for (f, r, s), friendship in self._friendship_cols.items():
+            logger.debug(
+                f"{f} : {self.problem.solution[friendship]} => {r.name} at {s}"
+            )
+
+    def _add_cut(self, cells, low, commit):
+        # a part of the committed cells of a previous solution must change
+        R, S = len(self._role_keys), len(self.slots)
+        v, r, s = cells
+        inside = (s >= low) & (s < commit)
+        col, ev, er, es, _ = self._entries
+        keys = (ev * R + er) * S + es
+        taken = np.isin(keys, ((v * R + r) * S + s)[inside])
+        taken &= self.problem.lower[col] == 0
+        count = len(np.unique(keys[taken]))
+        if not count:
+            return
+        changes = max(int(count * self.diversity), 1)
+        self.problem.add_rows(
+            1, np.zeros(taken.sum()), col[taken], 1, "L", count - changes
         )
-        places_not_used = LpVariable.dicts(
-            "PlacesNotUsed", (self.volunteers, self.roles.keys()), cat="Binary"
+
+    def _commit(self, low, commit):
+        # keep columns starting before the commit boundary, a shift may
+        # overlap the next window where its cells are fixed
+        col, v, r, s, start = self._entries
+        chosen = (self.problem.values(col) > 0.5) & (start >= low) & (start < commit)
+        self._committed = tuple(
+            np.concatenate([committed, values[chosen]])
+            for committed, values in zip(self._committed, (v, r, s, start))
         )
-        places = LpVariable.dicts(
-            "Places", (self.volunteers, self.roles.keys()), cat="Binary"
+        self._places[v[chosen], r[chosen]] = True
+
+    def _slot_choices(self, possible, low):
+        # one column by cell for roles scheduled slot by slot
+        slot_roles = np.ones(len(self._role_keys), bool)
+        slot_roles[list(self.shifts.keys())] = False
+        v, r, s = np.nonzero(possible & slot_roles[None, :, None])
+        columns = self.problem.add_columns(len(v), cost=-self._weights[r])
+        return columns, v, r, s + low, s + low
+
+    def _shift_choices(self, possible, low):
+        # one column by shift fitting entirely in the possible cells
+        blocks = []
+        shifts = []
+        for r, lengths in self.shifts.items():
+            covered = np.zeros((len(self.volunteers), possible.shape[2] + 1), np.int64)
+            np.cumsum(possible[:, r, :], axis=1, out=covered[:, 1:])
+            for length in lengths:
+                if length > possible.shape[2]:
+                    continue
+                v, start = np.nonzero(
+                    covered[:, length:] - covered[:, :-length] == length
+                )
+                columns = self.problem.add_columns(
+                    len(v), cost=-self._weights[r] * length
+                )
+                blocks.append(
+                    (
+                        np.repeat(columns, length),
+                        np.repeat(v, length),
+                        np.full(len(v) * length, r),
+                        (start[:, None] + np.arange(length)).ravel() + low,
+                        np.repeat(start, length) + low,
+                    )
+                )
+                shifts.append(
+                    (columns, v, np.full(len(v), r), start + low, start + low + length)
+                )
+                logger.debug(f"{len(v)} possible shifts of {length} slots on {r}")
+        if shifts:
+            self._add_shift_gaps(*(np.concatenate(values) for values in zip(*shifts)))
+        return blocks
+
+    def _add_shift_gaps(self, col, v, r, start, end):
+        # a shift can't start where another one of the same volunteer and role
+        # position ends, both would be stored as one run of an undeclared length
+        R, S = len(self._role_keys), len(self.slots) + 1
+        place = v * R + r
+        self.problem.add_grouped_rows(
+            np.concatenate([place * S + end, place * S + start]),
+            np.concatenate([col, col]),
+            1,
+            "L",
+            1,
+            skip_single=True,
         )
-        friendship = LpVariable.dicts(
-            "Friendship",
-            (self.friendship.keys(), self.unduplicated_roles, self.slots),
-            cat="Binary",
+        # nor where a shift committed by a previous window ends
+        v, r, s, start_committed = self._committed
+        groups, inverse = np.unique(
+            (v * R + r) * S + start_committed, return_inverse=True
         )
-        friendshipMin = LpVariable.dicts(
-            "FriendshipMin",
-            (self.friendship.keys(), self.unduplicated_roles, self.slots),
-            cat="Float",
+        ends = np.zeros(len(groups), np.int64)
+        np.maximum.at(ends, inverse, s + 1)
+        self.problem.upper[col[np.isin(place * S + start, groups // S * S + ends)]] = 0
+
+    def _fixed_choices(self, low, high):
+        cells = [
+            (
+                self._volunteer_index[fixed.volunteer],
+                self._role_index[(fixed.role, fixed.position)],
+                self._slot_index[fixed.slot],
+            )
+            for fixed in self.fixed_slots
+            if fixed.volunteer in self._volunteer_index
+            and (fixed.role, fixed.position) in self._role_index
+            and low <= self._slot_index.get(fixed.slot, -1) < high
+        ]
+        v, r, s = np.array(cells, np.int64).reshape(-1, 3).T
+        start = s
+
+        # cells committed by a previous window inside this one
+        committed_v, committed_r, committed_s, committed_start = self._committed
+        carried = committed_s >= low
+        v = np.concatenate([v, committed_v[carried]])
+        r = np.concatenate([r, committed_r[carried]])
+        s = np.concatenate([s, committed_s[carried]])
+        start = np.concatenate([start, committed_start[carried]])
+
+        columns = self.problem.add_columns(
+            len(v), cost=-self._weights[r], lower=1.0, upper=1.0
         )
-        friendshipMax = LpVariable.dicts(
-            "FriendshipMax",
-            (self.friendship.keys(), self.unduplicated_roles, self.slots),
-            cat="Float",
+        return columns, v, r, s, start
+
+    def _build(self, low, high):
+        V, R, S = len(self.volunteers), len(self._role_keys), len(self.slots)
+
+        # cells a volunteer can take: available, needed and right category
+        possible = (
+            self.availabilities[:, None, low:high]
+            & self.needs[None, :, low:high]
+            & self.allowed[:, :, None]
         )
+        blocks = [self._slot_choices(possible, low)]
+        blocks += self._shift_choices(possible, low)
+        blocks.append(self._fixed_choices(low, high))
+        col, v, r, s, start = (np.concatenate(values) for values in zip(*blocks))
+        self._entries = (col, v, r, s, start)
 
         # only one person by time slot
-        self._missing = {r: [] for r in self.roles.keys()}
-        for r, needs in self.roles.items():
-            for s in self.slots:
-                if s in needs:
-                    logger.debug(f"Set {r} at {s} as needed")
-                    self.problem += (
-                        lpSum([choices[v][r][s] for v in self.volunteers]) <= 1
-                    )
-                    self._missing[r].append(s)
-                else:
-                    logger.debug(f"Set {r} at {s} as unneeded")
-                    self.problem += (
-                        lpSum([choices[v][r][s] for v in self.volunteers]) == 0
-                    )
+        self.problem.add_grouped_rows(r * S + s, col, 1, "L", 1, skip_single=True)
 
         # only one post by time slot and person
-        for v in self.volunteers:
-            for s in self.slots:
-                self.problem += (
-                    lpSum([choices[v][r][s] for r in self.roles.keys()]) <= 1
-                )
-            for r in self.roles.keys():
-                self.problem += places_not_used[v][r] <= 1 - 1 / (
-                    len(self.slots) + 1
-                ) * lpSum([choices[v][r][s] for s in self.slots])
-                self.problem += places_not_used[v][r] >= 0.5 - lpSum(
-                    [choices[v][r][s] for s in self.slots]
-                )
-                self.problem += places[v][r] == 1 - places_not_used[v][r]
-
-        # regroup friends
-        if self._friend_mode != FriendMode.NONE:
-            for v, common_slots in self.friendship.items():
-                if self._friend_mode == FriendMode.STRICT:
-                    for r, s in [
-                        (r, s)
-                        for r in self.unduplicated_roles
-                        for s in self.slots
-                        if s in common_slots
-                    ]:
-                        if r.occurence >= 2:
-                            logger.debug(
-                                f"Set {v[0]} and {v[1]} as possible on {r} for {s}"
-                            )
-                            self.problem += (
-                                choices[v[0]][(r, 0)][s] == choices[v[1]][(r, 1)][s]
-                            )
-                        else:
-                            self.problem += choices[v[0]][(r, 0)][s] == 0
-                            self.problem += choices[v[1]][(r, 0)][s] == 0
-                elif self._friend_mode == FriendMode.AT_BEST:
-                    for r, n, s in [
-                        (r, n, s)
-                        for r, n in self.unduplicated_roles.items()
-                        for s in self.slots
-                    ]:
-                        if r.occurence >= 2 and s in common_slots and s in n:
-                            logger.debug(
-                                f"Set {v[0]} and {v[1]} as possible on {r} for {s}"
-                            )
-                            self.problem += friendshipMax[v][r][s] == (
-                                1 / len(v)
-                            ) * lpSum(
-                                [
-                                    choices[f][(r, p)][s]
-                                    for f in v
-                                    for p in range(0, r.occurence)
-                                ]
-                            )
-                            self.problem += friendshipMin[v][r][s] == (
-                                1 / len(v)
-                            ) * lpSum(
-                                [
-                                    choices[f][(r, p)][s]
-                                    for f in v
-                                    for p in range(0, r.occurence)
-                                ]
-                            ) - (
-                                (len(v) - 1) / len(v)
-                            )
-                            self.problem += (
-                                friendship[v][r][s] <= friendshipMax[v][r][s]
-                            )
-                            self.problem += (
-                                friendship[v][r][s] >= friendshipMin[v][r][s]
-                            )
-                        else:
-                            self.problem += friendship[v][r][s] == 0
-                            self.problem += (
-                                friendship[v][r][s] == friendshipMax[v][r][s]
-                            )
-                            self.problem += (
-                                friendship[v][r][s] == friendshipMin[v][r][s]
-                            )
-
-        # be sure availability of people
-        for v in self.volunteers:
-            for s in self.slots:
-                if not any(s.is_contained_by(availability) for availability in v.slots):
-                    logger.debug(f"Set {v} as unavailable at {s}")
-                    for r in self.roles.keys():
-                        self.problem += choices[v][r][s] == 0
-            # not on role with incorrect category
-            if v.categories.exists():
-                for r in self.roles.keys():
-                    if r[0].category and r[0].category not in v.categories.all():
-                        logger.debug(f"Set {v} as unavailable for {r}")
-                        for s in self.slots:
-                            self.problem += choices[v][r][s] == 0
-
-        # force place
-        for fixed in self.fixed_slots:
-            self.problem += (
-                choices[fixed.volunteer][(fixed.role, fixed.position)][fixed.slot] == 1
-            )
+        self.problem.add_grouped_rows(v * S + s, col, 1, "L", 1, skip_single=True)
 
-        # Count how many slots are filled
-        self.problem += lpSum(
-            [
-                -choices[v][r][s] * r[0].weight
-                for v in self.volunteers
-                for r in self.roles.keys()
-                for s in self.slots
-            ]
-            + [places[v][r] for v in self.volunteers for r in self.roles.keys()]
-            + [
-                -3 * friendship[f][r][s]
-                for f in self.friendship.keys()
-                for r in self.unduplicated_roles
-                for s in self.slots
-            ]
+        # one place by volunteer on each role used, taken by any of its columns
+        columns, first = np.unique(col, return_index=True)
+        places, group = np.unique(v[first] * R + r[first], return_inverse=True)
+        # places already taken in a previous window are free
+        places = self.problem.add_columns(
+            len(places), cost=np.where(self._places.ravel()[places], 0.0, 1.0)
+        )
+        rows = np.arange(len(columns))
+        self.problem.add_rows(
+            len(columns),
+            np.concatenate([rows, rows]),
+            np.concatenate([columns, places[group]]),
+            np.concatenate([np.ones(len(columns)), -np.ones(len(columns))]),
+            "L",
+            0,
         )
 
-        self.problem.solve(PULP_CBC_CMD(timeLimit=120))
+        # cell lookup for the friendship rows and the extraction
+        keys = (v * R + r) * S + s
+        order = np.argsort(keys, kind="stable")
+        self._cell_keys, self._cell_cols = keys[order], col[order]
+        logger.debug(
+            f"Model with {self.problem.ncols} columns and {self.problem.nrows} rows "
+            f"for {V} volunteers, {R} roles and {S} slots"
+        )
 
-        logger.debug(f"Status:{LpStatus[self.problem.status]}")
+    def _cells(self, volunteer, role, slot):
+        key = (
+            self._volunteer_index[volunteer] * len(self._role_keys)
+            + self._role_index[role]
+        ) * len(self.slots) + self._slot_index[slot]
+        lo, hi = np.searchsorted(self._cell_keys, [key, key + 1])
+        return self._cell_cols[lo:hi]
 
-        if self.problem.status != LpStatusOptimal:
-            return
+    def _on_role(self, volunteer, role, slot, positions=None):
+        if positions is None:
+            positions = range(0, role.occurence)
+        return any(
+            self.problem.values(self._cells(volunteer, (role, p), slot)).sum() > 0.5
+            for p in positions
+        )
 
-        self._scheduled = {}
-        for v in self.volunteers:
-            self._scheduled[v] = {}
-            for s in self.slots:
-                self._scheduled[v][s] = []
-                for r in self.roles:
-                    if value(choices[v][r][s]) == 1:
-                        logger.debug(
-                            f"{v.volunteer.firstname} => "
-                            f"{r[0].name}-{r[1]} at {s.start}"
-                        )
-                        self._scheduled[v][s].append(r)
-                        self._missing[r].remove(s)
-            for r in self.roles:
-                if value(places[v][r]) == 1:
-                    logger.debug(
-                        f"{v.volunteer.firstname} will be at {r[0].name}-{r[1]}"
-                    )
+    def _is_split(self, pair, role, slot):
+        if role.occurence >= 2:
+            return self._on_role(pair[0], role, slot, [0]) != self._on_role(
+                pair[1], role, slot, [1]
+            )
+        return any(self._on_role(f, role, slot) for f in pair)
+
+    def _in_window(self, pair, role, slot):
+        return (
+            self._window[0] <= self._slot_index[slot] < self._window[1]
+            and (pair, role, slot) not in self._friendship_rows
+        )
+
+    def _split_friends(self):
+        if self._friend_mode != FriendMode.STRICT:
+            return []
+        return [
+            (pair, r, s)
+            for pair, common_slots in self.friendship.items()
+            for r in self.unduplicated_roles
+            for s in common_slots
+            if self._in_window(pair, r, s) and self._is_split(pair, r, s)
+        ]
 
-        for f in self.friendship:
-            for r in self.unduplicated_roles:
-                for s in self.slots:
-                    logger.debug(
-                        f"{f} : {value(friendshipMin[f][r][s])} <= "
-                        f"{value(friendship[f][r][s])} <= "
-                        f"{value(friendshipMax[f][r][s])} => "
-                        f"{r.name} at {s.start}"
+    def _shared_roles(self):
+        needed = {role: set(slots) for role, slots in self.unduplicated_roles.items()}
+        return [
+            (pair, r, s)
+            for pair, common_slots in self.friendship.items()
+            for r in self.unduplicated_roles
+            if r.occurence >= 2
+            for s in common_slots
+            if s in needed[r] and self._in_window(pair, r, s)
+        ]
+
+    def _add_friendships(self, split):
+        for v, r, s in split:
+            logger.debug(f"Set {v[0]} and {v[1]} as possible on {r} for {s}")
+            self._friendship_rows.add((v, r, s))
+            if self._friend_mode == FriendMode.STRICT:
+                if r.occurence >= 2:
+                    first = self._cells(v[0], (r, 0), s)
+                    second = self._cells(v[1], (r, 1), s)
+                    self.problem.add_rows(
+                        1,
+                        np.zeros(len(first) + len(second)),
+                        np.concatenate([first, second]),
+                        np.concatenate([np.ones(len(first)), -np.ones(len(second))]),
+                        "E",
+                        0,
                     )
+                else:
+                    for f in v:
+                        cells = self._cells(f, (r, 0), s)
+                        self.problem.add_rows(1, np.zeros(len(cells)), cells, 1, "E", 0)
+                continue
 
-        # remove empty slots
-        self._scheduled = {
-            v: {s: r[0] for s, r in scheduled.items() if r}
-            for v, scheduled in self._scheduled.items()
+            together = np.concatenate(
+                [self._cells(f, (r, p), s) for f in v for p in range(0, r.occurence)]
+            )
+            if not len(together):
+                continue
+            friendship = self.problem.add_columns(1, cost=-3.0)
+            self._friendship_cols[(v, r, s)] = friendship[0]
+            for sense, rhs in (("L", 0), ("G", -(len(v) - 1) / len(v))):
+                self.problem.add_rows(
+                    1,
+                    np.zeros(len(together) + 1),
+                    np.concatenate([friendship, together]),
+                    np.concatenate([[1], -np.ones(len(together)) / len(v)]),
+                    sense,
+                    rhs,
+                )
+
+    def _extract(self):
+        v, r, s, _ = self._committed
+
+        scheduled = {volunteer: {} for volunteer in self.volunteers}
+        assigned = np.zeros(self.needs.shape, bool)
+        for v_idx, r_idx, s_idx in zip(v, r, s):
+            volunteer, role, slot = (
+                self.volunteers[v_idx],
+                self._role_keys[r_idx],
+                self.slots[s_idx],
+            )
+            logger.debug(
+                f"{volunteer.volunteer.firstname} => "
+                f"{role[0].name}-{role[1]} at {slot.start}"
+            )
+            scheduled[volunteer][slot] = role
+            assigned[r_idx, s_idx] = True
+
+        scheduled = {
+            volunteer: dict(sorted(slots.items()))
+            for volunteer, slots in scheduled.items()
+        }
+        missing = {
+            role: [
+                slot
+                for s_idx, slot in enumerate(self.slots)
+                if self.needs[r_idx, s_idx] and not assigned[r_idx, s_idx]
+            ]
+            for r_idx, role in enumerate(self._role_keys)
         }
+
+        # assignment part of the objective, comparable between solutions
+        objective = (
+            len(np.unique(v * len(self._role_keys) + r)) - self._weights[r].sum()
+        )
+        return Solution(scheduled, missing, objective)
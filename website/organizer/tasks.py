@@ -3,14 +3,15 @@ import logging
 from email.mime.image import MIMEImage
 from functools import lru_cache
 
-from common.fields import Slot
+from common.fields import IntervalSet
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
 from django.db.models import F
 from django.template.loader import render_to_string
 from django.utils.timezone import now
+from event.models import Role
 from mailer.tasks import send_mass_mails
-from volunteers.models import VolunteerFriendshipWaiting
+from volunteers.models import VolunteerAvailability, VolunteerFriendshipWaiting
 
 from celery import shared_task
 
@@ -23,9 +24,20 @@ logger = logging.getLogger(__name__)
 def clean_old_schedule(self):
     seven_days_ago = now() - datetime.timedelta(days=7)
 
-    return EventSchedule.objects.filter(
-        deletable=True, validated_at__isnull=True, saved_at__lt=seven_days_ago
-    ).delete()
+    removed = EventSchedule.purge(
+        EventSchedule.objects.filter(
+            deletable=True, validated_at__isnull=True, saved_at__lt=seven_days_ago
+        )
+    )
+    logger.info(f"Old schedules removed: {removed}")
+    return removed
+
+
+@shared_task(bind=True)
+def purge_schedules(self, ids):
+    removed = EventSchedule.purge(EventSchedule.objects.filter(pk__in=ids))
+    logger.info(f"Schedules {ids} removed: {removed}")
+    return removed
 
 
 @lru_cache()
@@ -45,22 +57,29 @@ def send_volunteer_slots(self, schedule, remainder):
         f"Remainder: {remainder}"
     )
 
+    snapshot = schedule.snapshot()
+    # the snapshot only holds ids, the addresses and roles are read fresh
+    volunteers = VolunteerAvailability.objects.select_related("volunteer").in_bulk(
+        [row["volunteer"] for row in snapshot.by_volunteers]
+    )
+    roles = Role.objects.filter(
+        event_id=schedule.event_id, with_validation_email=True
+    ).in_bulk()
+
     mails = []
-    for volunteer, roles in schedule.get_schedule_by_volunteers().items():
-        logger.debug(f"Send slot for {volunteer}: {roles}")
-        slots_by_role = {
-            role["role"]: []
-            for role in roles.values()
-            if "role" in role and role["role"].with_validation_email
-        }
-        for slot, role_info in roles.items():
-            if "role" in role_info and role_info["role"].with_validation_email:
-                slots_by_role[role_info["role"]].append(slot)
+    for row in snapshot.by_volunteers:
+        volunteer = volunteers.get(row["volunteer"])
+        if volunteer is None:
+            continue
+        logger.debug(f"Send slot for {volunteer}: {row['slots']}")
+        slots_by_role = {}
+        for slot, role_info in row["slots"].items():
+            if role_info.get("role") in roles:
+                slots_by_role.setdefault(roles[role_info["role"]], []).append(slot)
         role_by_slots = {
             slot: role
             for role, slots in slots_by_role.items()
-            if role.with_validation_email
-            for slot in Slot.aggregate(slots)
+            for slot in IntervalSet(slots)
         }
 
         role_by_slots = {
@@ -166,7 +185,7 @@ def volunteers_remainder(self):
                     ),
                     "waiting_friend_firstname": waiting_friend_firstname,
                     "waiting_friend_lastname": waiting_friend_lastname,
-                    "slots": volunteer.slots,
+                    "slots": volunteer.availability.slots(),
                 },
             )
             html_content = render_to_string(
@@ -185,7 +204,7 @@ def volunteers_remainder(self):
                     ),
                     "waiting_friend_firstname": waiting_friend_firstname,
                     "waiting_friend_lastname": waiting_friend_lastname,
-                    "slots": volunteer.slots,
+                    "slots": volunteer.availability.slots(),
                 },
             )
 
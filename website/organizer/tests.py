@@ -1,9 +1,32 @@
+import io
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from common.fields import Slot
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+from event.models import Role, RoleCategory
+from pulp import (
+    LpStatusNotSolved,
+    LpStatusOptimal,
+    LpStatusUnbounded,
+    LpStatusUndefined,
+)
+from volunteers.models import (
+    Volunteer,
+    VolunteerAvailability,
+    VolunteerFriendshipWaiting,
+    VolunteerSlot,
+)
 
-from .models import EventWithSchedule
+from .forms import ScheduleEventHiddenFormSet
+from .mip import Model
+from .models import EventSchedule, EventScheduleSlot, EventWithSchedule, ScheduleCell
+from .scheduling import FriendMode, Scheduler
+from .tasks import send_volunteer_slots
+from .windows import GridWindow
 
 
 class EventWithVolunteersModelTests(TestCase):
@@ -40,3 +63,939 @@ class EventWithVolunteersModelTests(TestCase):
                 ),
             ],
         )
+
+    def test_should_share_grid(self):
+        event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+
+        grid = event.schedule_grid()
+
+        self.assertIs(EventWithSchedule.objects.get(pk=event.pk).schedule_grid(), grid)
+        self.assertEqual(grid.index[grid[2]], 2)
+        event.slot_duration_schedule = timedelta(hours=1)
+        event.save()
+        self.assertEqual(len(event.schedule_grid()), 2)
+
+
+class EventScheduleModelTests(TestCase):
+    def setUp(self):
+        self.event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+
+    def test_should_store_cells_as_shifts(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        volunteer = VolunteerAvailability.objects.create(
+            event=self.event,
+            volunteer=Volunteer.objects.create(
+                firstname="v1", lastname="v1", email="v1@test.com"
+            ),
+        )
+        schedule = EventSchedule.objects.create(event=self.event)
+        slots = self.event.schedule_slots()
+
+        schedule.set_cells(
+            [ScheduleCell(role, 0, slot, volunteer) for slot in slots[:3]]
+            + [ScheduleCell(role, 0, slots[3])]
+        )
+
+        self.assertEqual(schedule.eventscheduleslot_set.count(), 2)
+        self.assertListEqual(
+            [(cell.slot, cell.volunteer) for cell in schedule.get_cells()],
+            [(slot, volunteer) for slot in slots[:3]] + [(slots[3], None)],
+        )
+        self.assertDictEqual(schedule.get_missing_by_slots(), {slots[3]: 1})
+
+    def test_should_cache_snapshot_by_version(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        schedule = EventSchedule.objects.create(event=self.event)
+        slots = self.event.schedule_slots()
+        schedule.set_cells([ScheduleCell(role, 0, slot) for slot in slots])
+
+        self.assertEqual(len(schedule.snapshot().missings), 4)
+        reloaded = EventSchedule.objects.get(pk=schedule.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(reloaded.snapshot().missings), 4)
+
+        schedule.set_cells([ScheduleCell(role, 0, slot) for slot in slots[:2]])
+        self.assertEqual(len(schedule.snapshot().missings), 2)
+
+        # projections by ids, a deleted volunteer leaves its cells missing
+        volunteer = VolunteerAvailability.objects.create(
+            event=self.event,
+            volunteer=Volunteer.objects.create(
+                firstname="v1", lastname="v1", email="v1@test.com"
+            ),
+        )
+        volunteer.set_slots(slots)
+        schedule.apply_changes({(role.id, 0, slots[0]): volunteer.id})
+        snapshot = schedule.snapshot()
+        self.assertEqual(
+            snapshot.by_roles[0]["slots"][slots[0]]["volunteer"], volunteer.id
+        )
+        self.assertDictEqual(
+            snapshot.by_volunteers[0]["slots"][slots[0]],
+            {
+                "role": role.id,
+                "position": 0,
+                "available": True,
+                "availability": True,
+                "nb": 1,
+                "first": slots[0],
+            },
+        )
+        self.assertEqual(len(snapshot.missings), 1)
+        volunteer.delete()
+        reloaded = EventSchedule.objects.get(pk=schedule.pk)
+        self.assertGreater(reloaded.modified_at, schedule.modified_at)
+        self.assertEqual(len(reloaded.snapshot().missings), 2)
+
+    @patch("organizer.tasks.send_mass_mails")
+    @patch("organizer.tasks.EmailMultiAlternatives")
+    @patch("organizer.tasks.plan")
+    def test_should_send_slots_from_snapshot(self, plan, email, send_mass_mails):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        volunteer = VolunteerAvailability.objects.create(
+            event=self.event,
+            volunteer=Volunteer.objects.create(
+                firstname="v1", lastname="v1", email="v1@test.com"
+            ),
+        )
+        slots = self.event.schedule_slots()
+        schedule = EventSchedule.objects.create(event=self.event)
+        schedule.set_cells(
+            [ScheduleCell(role, 0, slot, volunteer) for slot in slots[:2]]
+            + [ScheduleCell(role, 0, slot) for slot in slots[2:]]
+        )
+        schedule.snapshot()
+        # the cached snapshot is read, the address is read fresh
+        Volunteer.objects.filter(pk=volunteer.volunteer_id).update(
+            email="v1@example.com"
+        )
+
+        with self.assertNumQueries(3):
+            send_volunteer_slots(schedule, False)
+
+        self.assertEqual(email.call_args.args[3], ["v1@example.com"])
+        self.assertIn(str(slots[0].start.hour), email.call_args.args[1])
+        send_mass_mails.delay.assert_called_once()
+
+    def test_should_clone_shifts_in_one_statement(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            occurence=2,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        schedule = EventSchedule.objects.create(event=self.event, name="base")
+        slots = self.event.schedule_slots()
+        schedule.set_cells(
+            [ScheduleCell(role, 0, slot) for slot in slots[:2]]
+            + [ScheduleCell(role, 1, slot, fixed=True) for slot in slots]
+        )
+
+        with self.assertNumQueries(4):
+            copy = schedule.clone(name="copy")
+
+        self.assertNotEqual(copy.pk, schedule.pk)
+        self.assertEqual(copy.name, "copy")
+        self.assertListEqual(
+            [(c.role, c.position, c.slot, c.fixed) for c in copy.get_cells()],
+            [(c.role, c.position, c.slot, c.fixed) for c in schedule.get_cells()],
+        )
+
+        # a version is copied as another version of the same schedule
+        sibling = schedule.branch().clone()
+        self.assertEqual((sibling.based_on, sibling.depth), (schedule, 1))
+        self.assertEqual(sibling.eventscheduleslot_set.count(), 0)
+        self.assertEqual(len(sibling.get_cells()), 6)
+
+    def test_should_apply_changed_cells(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            occurence=2,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        v1, v2 = [
+            VolunteerAvailability.objects.create(
+                event=self.event,
+                volunteer=Volunteer.objects.create(
+                    firstname=name, lastname=name, email=f"{name}@test.com"
+                ),
+            )
+            for name in ("v1", "v2")
+        ]
+        slots = self.event.schedule_slots()
+        v1.set_slots(slots)
+        v2.set_slots(slots[:2])
+        schedule = EventSchedule.objects.create(event=self.event)
+        schedule.set_cells(
+            [ScheduleCell(role, 0, slot, v1) for slot in slots]
+            + [ScheduleCell(role, 1, slot) for slot in slots]
+        )
+
+        with self.assertRaises(ValidationError):
+            schedule.apply_changes({(role.id, 1, slots[0]): v1.id})
+        with self.assertRaises(ValidationError):
+            schedule.apply_changes({(role.id, 1, slots[3]): v2.id})
+
+        # move v1 to the second position and put v2 in its place
+        with self.assertNumQueries(10):
+            schedule.apply_changes(
+                {(role.id, 0, slots[1]): v2.id, (role.id, 1, slots[1]): v1.id}
+            )
+
+        self.assertListEqual(
+            [(c.position, c.volunteer) for c in schedule.get_cells()],
+            [(0, v1), (0, v2), (0, v1), (0, v1), (1, None), (1, v1), (1, None)]
+            + [(1, None)],
+        )
+        self.assertEqual(schedule.eventscheduleslot_set.count(), 6)
+
+    def test_should_store_versions_as_deltas(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        volunteer = VolunteerAvailability.objects.create(
+            event=self.event,
+            volunteer=Volunteer.objects.create(
+                firstname="v1", lastname="v1", email="v1@test.com"
+            ),
+        )
+        slots = self.event.schedule_slots()
+        volunteer.set_slots(slots)
+        schedule = EventSchedule.objects.create(event=self.event)
+        schedule.set_cells([ScheduleCell(role, 0, slot) for slot in slots])
+
+        version = schedule.branch(name="copy")
+        version.apply_changes({(role.id, 0, slots[1]): volunteer.id})
+
+        self.assertEqual(version.eventscheduleslot_set.count(), 1)
+        self.assertListEqual(
+            [cell.volunteer for cell in version.get_cells()],
+            [None, volunteer, None, None],
+        )
+
+        # back to the parent value, nothing is stored anymore
+        version.apply_changes({(role.id, 0, slots[1]): None})
+        self.assertEqual(version.eventscheduleslot_set.count(), 0)
+        version.apply_changes({(role.id, 0, slots[2]): volunteer.id})
+
+        # a changed or deleted parent compacts its versions first
+        schedule.apply_changes({(role.id, 0, slots[0]): volunteer.id})
+        version.refresh_from_db()
+        self.assertIs(version.delta, False)
+        self.assertEqual(version.eventscheduleslot_set.count(), 3)
+        self.assertListEqual(
+            [cell.volunteer for cell in version.get_cells()],
+            [None, None, volunteer, None],
+        )
+        deep = version
+        for _ in range(6):
+            deep = deep.branch()
+        self.assertEqual((deep.delta, deep.depth), (False, 0))
+
+        version.delete()
+        self.assertEqual(len(deep.get_cells()), 4)
+
+    def test_should_delete_event_with_versions(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        schedule = EventSchedule.objects.create(event=self.event)
+        schedule.set_cells(
+            [ScheduleCell(role, 0, slot) for slot in self.event.schedule_slots()]
+        )
+        version = schedule.branch()
+        version.branch()
+        EventSchedule.objects.filter(pk=version.pk).delete()
+        self.assertEqual(EventSchedule.objects.filter(delta=True).count(), 0)
+        self.assertEqual(len(EventSchedule.objects.last().get_cells()), 4)
+
+        schedule.branch().branch()
+        self.event.delete()
+
+        self.assertFalse(EventSchedule.objects.exists())
+        self.assertFalse(EventScheduleSlot.objects.exists())
+
+    def test_should_purge_by_chunks(self):
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            occurence=3,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        slots = self.event.schedule_slots()
+        schedules = []
+        for _ in range(3):
+            schedule = EventSchedule.objects.create(event=self.event)
+            schedule.set_cells(
+                [ScheduleCell(role, p, slot) for p in range(3) for slot in slots]
+            )
+            schedules.append(schedule)
+        kept = schedules[0].branch(deletable=False)
+
+        removed = EventSchedule.purge(
+            EventSchedule.objects.filter(deletable=True), chunk_size=2
+        )
+
+        self.assertDictEqual(removed, {"schedules": 3, "shifts": 9})
+        self.assertListEqual(list(EventSchedule.objects.all()), [kept])
+        self.assertEqual(len(EventSchedule.objects.get().get_cells()), 12)
+
+    def test_should_project_schedule_in_constant_queries(self):
+        event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T00:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-03T00:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+        role = Role.objects.create(
+            name="bar",
+            event=event,
+            occurence=10,
+            start_date=event.start_date,
+            end_date=event.end_date,
+        )
+        volunteers = VolunteerAvailability.objects.bulk_create(
+            VolunteerAvailability(event=event, volunteer=volunteer)
+            for volunteer in Volunteer.objects.bulk_create(
+                Volunteer(firstname=f"v{i}", lastname=f"n{i:03}", email="v@test.com")
+                for i in range(500)
+            )
+        )
+        slots = event.schedule_slots()
+        VolunteerSlot.objects.bulk_create(
+            VolunteerSlot(
+                availability=volunteer,
+                start_date=slots[i % 80].start,
+                end_date=slots[i % 80 + 16].end,
+            )
+            for i, volunteer in enumerate(volunteers)
+        )
+        schedule = EventSchedule.objects.create(event=event)
+        schedule.set_cells(
+            [
+                ScheduleCell(role, position, slot, volunteers[idx // 4 + position])
+                for position in range(10)
+                for idx, slot in enumerate(slots)
+            ]
+        )
+        schedule = EventSchedule.objects.select_related("event").get(pk=schedule.pk)
+
+        with self.assertNumQueries(3):
+            by_volunteers = schedule.get_schedule_by_volunteers()
+        with self.assertNumQueries(1):
+            by_roles = schedule.get_schedule_by_roles()
+
+        self.assertEqual(len(by_volunteers), 500)
+        self.assertDictEqual(
+            by_volunteers[volunteers[0]],
+            {
+                slot: {
+                    "role": role,
+                    "position": 0,
+                    "available": True,
+                    "availability": True,
+                    "nb": 4,
+                    "first": slots[0],
+                }
+                for slot in slots[:4]
+            }
+            | {
+                slot: {"availability": True, "nb": 13, "first": slots[4]}
+                for slot in slots[4:17]
+            },
+        )
+        self.assertEqual(len(by_roles), 10)
+        self.assertDictEqual(
+            by_roles[(1, 0, role)][slots[5]],
+            {"volunteer": volunteers[1], "nb": 4, "first": slots[4]},
+        )
+
+
+class ScheduleCellFormSetTests(TestCase):
+    def test_should_index_forms_by_cell(self):
+        event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+        role = Role.objects.create(
+            name="bar",
+            event=event,
+            start_date=event.start_date,
+            end_date=event.start_date + timedelta(hours=1),
+        )
+        slots = event.schedule_slots()
+        formset = ScheduleEventHiddenFormSet(
+            schedule=EventSchedule(event=event),
+            cells=[ScheduleCell(role, 0, slot) for slot in slots[:2]],
+        )
+
+        self.assertIn(((role, 0), slots[1]), formset)
+        self.assertNotIn(((role, 0), slots[2]), formset)
+        self.assertIs(formset[((role, 0), slots[1])], formset[1])
+        self.assertListEqual(
+            list(formset.rows([(role, 0)], slots)),
+            [((role, 0), [formset[0], formset[1], None, None])],
+        )
+
+
+class ScheduleNewViewTests(TestCase):
+    def setUp(self):
+        self.event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+        self.role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_save_schedule_on_first_post(self, validate):
+        url = reverse("organizer:schedule_new", kwargs={"slug": self.event.slug})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(EventSchedule.objects.count(), 0)
+
+        slots = self.event.schedule_slots()
+        data = {
+            "base-slug": self.event.slug,
+            "base-captcha": "captcha",
+            "base-name": "new",
+            "slots-TOTAL_FORMS": len(slots),
+            "slots-INITIAL_FORMS": len(slots),
+        }
+        for idx, slot in enumerate(slots):
+            data[f"slots-{idx}-cell"] = ScheduleCell(self.role, 0, slot).key
+        response = self.client.post(url, data)
+
+        schedule = EventSchedule.objects.get()
+        self.assertRedirects(
+            response,
+            reverse(
+                "organizer:schedule_edit",
+                kwargs={"slug": self.event.slug, "id": schedule.id},
+            ),
+        )
+        self.assertEqual(schedule.name, "new")
+        self.assertEqual(len(schedule.get_cells()), len(slots))
+
+
+class ScheduleRenderingTests(TestCase):
+    def setUp(self):
+        self.event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T00:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-03T00:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+        role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            occurence=10,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        volunteers = VolunteerAvailability.objects.bulk_create(
+            VolunteerAvailability(event=self.event, volunteer=volunteer)
+            for volunteer in Volunteer.objects.bulk_create(
+                Volunteer(firstname=f"v{i}", lastname=f"n{i:03}", email="v@test.com")
+                for i in range(300)
+            )
+        )
+        slots = self.event.schedule_slots()
+        VolunteerSlot.objects.bulk_create(
+            VolunteerSlot(
+                availability=volunteer,
+                start_date=slots[i % 80].start,
+                end_date=slots[i % 80 + 16].end,
+            )
+            for i, volunteer in enumerate(volunteers)
+        )
+        self.schedule = EventSchedule.objects.create(event=self.event)
+        self.schedule.set_cells(
+            [
+                ScheduleCell(role, position, slot, volunteers[idx // 4 + position])
+                for position in range(10)
+                for idx, slot in enumerate(slots)
+            ]
+        )
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+    def test_should_render_big_schedule(self):
+        # 300 volunteers on 96 slots in a few queries, the validate page
+        # reads the snapshot cached by the detail page
+        kwargs = {"slug": self.event.slug, "id": self.schedule.id}
+        for name, queries in (
+            ("schedule_detail", 7),
+            ("schedule_validate", 4),
+            ("schedule_edit", 7),
+        ):
+            with self.assertNumQueries(queries):
+                response = self.client.get(reverse(f"organizer:{name}", kwargs=kwargs))
+            self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="slots-0-volunteer"')
+
+    def test_should_send_grid_by_version(self):
+        url = reverse(
+            "organizer:schedule_grid",
+            kwargs={"slug": self.event.slug, "id": self.schedule.id},
+        )
+
+        with self.assertNumQueries(10):
+            response = self.client.get(url)
+
+        grid = response.json()
+        self.assertEqual(len(grid["slots"]), 96)
+        self.assertEqual(len(grid["volunteers"]), 300)
+        self.assertListEqual(grid["cells"][0], [0, 0, 0, 0])
+        self.assertEqual(len(grid["cells"]), 960)
+
+        etag = response.headers["ETag"]
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        role = grid["roles"][0][0]
+        self.schedule.apply_changes({(role, 0, self.event.schedule_slots()[0]): None})
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(response.json()["cells"][0], [0, 0, 0, None])
+
+        # a renamed role or an edited volunteer changes the version too
+        etag = response.headers["ETag"]
+        renamed = Role.objects.get(pk=role)
+        renamed.name = "renamed"
+        renamed.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.json()["roles"][0][1], "renamed")
+        etag = response.headers["ETag"]
+        volunteer = Volunteer.objects.get(lastname="n000")
+        volunteer.phonenumber = "+33612345678"
+        volunteer.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.json()["volunteers"][0][2], "+33612345678")
+        etag = response.headers["ETag"]
+        VolunteerAvailability.bulk_set_slots(
+            {VolunteerAvailability.objects.get(volunteer=volunteer): []}
+        )
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.json()["volunteers"][0][4], "0")
+
+        # revalidated without reading the roles nor the volunteers
+        etag = response.headers["ETag"]
+        with self.assertNumQueries(3):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class EventVolunteersMixin:
+    # one night event on two days with three volunteers available all along
+    def setUp(self):
+        self.event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T20:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-02T04:00:00+02:00"),
+            slot_duration_schedule=timedelta(hours=1),
+        )
+        self.role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        self.slots = self.event.schedule_slots()
+        self.availabilities = VolunteerAvailability.objects.bulk_create(
+            VolunteerAvailability(event=self.event, volunteer=volunteer)
+            for volunteer in Volunteer.objects.bulk_create(
+                Volunteer(firstname=f"v{i}", lastname=f"n{i}", email="v@test.com")
+                for i in range(3)
+            )
+        )
+        for availability in self.availabilities:
+            availability.set_slots(self.slots)
+        self.client.force_login(User.objects.create_superuser("admin"))
+
+
+class GridWindowTests(EventVolunteersMixin, TestCase):
+    def test_should_window_grid_by_day_and_page(self):
+        window = GridWindow(
+            self.event.schedule_grid(),
+            {"day": "2025-06-02", "page": "2"},
+            VolunteerAvailability.objects.order_by("id"),
+            per_page=2,
+        )
+
+        self.assertListEqual(window.slots, self.slots[4:])
+        self.assertListEqual(list(window.page), self.availabilities[2:])
+        self.assertEqual(window.query, "day=2025-06-02&page=2")
+        self.assertEqual(window.previous_query, "day=2025-06-02&page=1")
+
+        window = GridWindow(self.event.schedule_grid(), {}, [])
+        self.assertEqual(window.day.isoformat(), "2025-06-01")
+        self.assertListEqual(window.slots, self.slots[:4])
+
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_save_the_window_only(self, validate):
+        schedule = EventSchedule.objects.create(event=self.event)
+        schedule.set_cells(
+            [
+                ScheduleCell(self.role, 0, slot, self.availabilities[0])
+                for slot in self.slots
+            ]
+        )
+        url = reverse(
+            "organizer:schedule_edit",
+            kwargs={"slug": self.event.slug, "id": schedule.id},
+        )
+
+        response = self.client.get(url, {"day": "2025-06-02"})
+        self.assertEqual(len(response.context["slots"]), 4)
+
+        data = {
+            "base-slug": self.event.slug,
+            "base-captcha": "captcha",
+            "base-name": "",
+            "slots-TOTAL_FORMS": 4,
+            "slots-INITIAL_FORMS": 4,
+        }
+        for idx, slot in enumerate(self.slots[4:]):
+            data[f"slots-{idx}-cell"] = ScheduleCell(self.role, 0, slot).key
+            data[f"slots-{idx}-volunteer"] = self.availabilities[1].id
+        response = self.client.post(f"{url}?day=2025-06-02", data)
+
+        self.assertRedirects(response, f"{url}?day=2025-06-02&page=1")
+        self.assertListEqual(
+            [cell.volunteer for cell in schedule.get_cells()],
+            [self.availabilities[0]] * 4 + [self.availabilities[1]] * 4,
+        )
+
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_keep_availability_out_of_window(self, validate):
+        url = reverse("organizer:volunteers", kwargs={"slug": self.event.slug})
+        data = {
+            "base-slug": self.event.slug,
+            "base-captcha": "captcha",
+            "availability-TOTAL_FORMS": 3,
+            "availability-INITIAL_FORMS": 3,
+        }
+        for idx, availability in enumerate(self.availabilities):
+            data[f"availability-{idx}-availability_id"] = availability.id
+            data[f"availability-{idx}-slots"] = "f" if idx else "3"
+        response = self.client.post(f"{url}?day=2025-06-02", data)
+
+        self.assertRedirects(response, f"{url}?day=2025-06-02&page=1")
+        availability = VolunteerAvailability.objects.get(pk=self.availabilities[0].id)
+        self.assertListEqual(availability.slots_in(self.slots), self.slots[:6])
+        self.assertEqual(availability.maxslot, 6)
+
+
+class AvailabilityUpdateViewTests(EventVolunteersMixin, TestCase):
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_update_availabilities_in_bulk(self, validate):
+        category = RoleCategory.objects.create(event=self.event, name="bar")
+        url = reverse("organizer:volunteers", kwargs={"slug": self.event.slug})
+
+        with self.assertNumQueries(9):
+            self.client.get(url)
+
+        data = {
+            "base-slug": self.event.slug,
+            "base-captcha": "captcha",
+            "availability-TOTAL_FORMS": 3,
+            "availability-INITIAL_FORMS": 3,
+            "availability-2-DELETE": "on",
+        }
+        for idx, availability in enumerate(self.availabilities):
+            data[f"availability-{idx}-availability_id"] = availability.id
+            data[f"availability-{idx}-slots"] = "3"
+            data[f"availability-{idx}-categories"] = [category.id]
+        self.client.post(url, data)
+
+        availabilities = VolunteerAvailability.objects.prefetch_related(
+            "categories", "volunteerslot_set"
+        ).order_by("id")
+        self.assertEqual(len(availabilities), 2)
+        for availability in availabilities:
+            self.assertListEqual(
+                availability.slots_in(self.slots), self.slots[:2] + self.slots[4:]
+            )
+            self.assertListEqual(list(availability.categories.all()), [category])
+            self.assertEqual(availability.maxslot, 6)
+
+
+class DuoViewTests(EventVolunteersMixin, TestCase):
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_save_duos_in_bulk(self, validate):
+        v0, v1, v2 = self.availabilities
+        VolunteerFriendshipWaiting.objects.create(
+            volunteeravailability=v0, firstname="v1", lastname="n1"
+        )
+        url = reverse("organizer:duo", kwargs={"slug": self.event.slug})
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, 'value="sup"', count=1)
+
+        response = self.client.post(
+            url, {"slug": self.event.slug, str(v0.id): str(v0.id)}
+        )
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(8):
+            self.client.post(
+                url,
+                {
+                    "slug": self.event.slug,
+                    str(v0.id): str(v1.id),
+                    str(v1.id): str(v0.id),
+                    str(v2.id): "",
+                },
+            )
+
+        friends = dict(VolunteerAvailability.objects.values_list("id", "friend_id"))
+        self.assertDictEqual(friends, {v0.id: v1.id, v1.id: v0.id, v2.id: None})
+        self.assertFalse(VolunteerFriendshipWaiting.objects.exists())
+
+    def test_should_match_waiting_duos(self):
+        v0, v1, v2 = self.availabilities
+        VolunteerFriendshipWaiting.objects.create(
+            volunteeravailability=v0, firstname="V1", lastname="N1"
+        )
+        url = reverse("organizer:duo", kwargs={"slug": self.event.slug})
+
+        response = self.client.get(url)
+        self.assertListEqual(
+            [(m.availability, m.friend) for m in response.context["matches"]],
+            [(v0, v1)],
+        )
+
+        self.client.post(
+            reverse("organizer:duo_match", kwargs={"slug": self.event.slug})
+        )
+        friends = dict(VolunteerAvailability.objects.values_list("id", "friend_id"))
+        self.assertDictEqual(friends, {v0.id: v1.id, v1.id: v0.id, v2.id: None})
+        self.assertFalse(VolunteerFriendshipWaiting.objects.exists())
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.event = EventWithSchedule.objects.create(
+            name="toto",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T10:00:00+02:00"),
+            slot_duration_schedule=timedelta(minutes=30),
+        )
+        self.role = Role.objects.create(
+            name="bar",
+            event=self.event,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+
+    def add_volunteer(self, name, start, end):
+        volunteer = Volunteer.objects.create(
+            firstname=name, lastname=name, email=f"{name}@test.com"
+        )
+        availability = VolunteerAvailability.objects.create(
+            event=self.event, volunteer=volunteer
+        )
+        VolunteerSlot.objects.create(
+            availability=availability,
+            start_date=datetime.fromisoformat(start),
+            end_date=datetime.fromisoformat(end),
+        )
+        return availability
+
+    def test_should_schedule_by_shift(self):
+        self.role.shift_lengths = "60"
+        self.role.save()
+        v1 = self.add_volunteer(
+            "v1", "2025-06-01T08:00:00+02:00", "2025-06-01T09:00:00+02:00"
+        )
+        v2 = self.add_volunteer(
+            "v2", "2025-06-01T09:00:00+02:00", "2025-06-01T09:30:00+02:00"
+        )
+
+        scheduler = Scheduler(self.event)
+
+        self.assertIs(scheduler.is_valid, True)
+        slots = self.event.schedule_slots()
+        self.assertDictEqual(
+            scheduler.schedule[v1], {slots[0]: (self.role, 0), slots[1]: (self.role, 0)}
+        )
+        self.assertDictEqual(scheduler.schedule[v2], {})
+        self.assertListEqual(scheduler.missing[(self.role, 0)], slots[2:])
+
+    def test_should_schedule_by_window(self):
+        self.role.shift_lengths = "60"
+        self.role.save()
+        v1, v2 = [
+            self.add_volunteer(
+                name, "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+            )
+            for name in ("v1", "v2")
+        ]
+
+        scheduler = Scheduler(
+            self.event, horizon=timedelta(hours=1), overlap=timedelta(minutes=30)
+        )
+
+        self.assertListEqual(scheduler._windows(), [(0, 1, 2), (1, 2, 3), (2, 4, 4)])
+        self.assertIs(scheduler.is_valid, True)
+        slots = self.event.schedule_slots()
+        # a second shift can't follow the committed one, both take a turn
+        self.assertListEqual([len(scheduler.schedule[v]) for v in (v1, v2)], [2, 2])
+        self.assertListEqual(
+            sorted(slot for v in (v1, v2) for slot in scheduler.schedule[v]), slots
+        )
+        self.assertListEqual(scheduler.missing[(self.role, 0)], [])
+
+    def test_should_store_declared_shift_lengths(self):
+        self.role.shift_lengths = "60"
+        self.role.save()
+        for name in ("v1", "v2"):
+            self.add_volunteer(
+                name, "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+            )
+
+        for horizon in (None, timedelta(hours=1)):
+            scheduler = Scheduler(
+                self.event, horizon=horizon, overlap=timedelta(minutes=30)
+            )
+            self.assertIs(scheduler.is_valid, True)
+            schedule = EventSchedule.objects.create(event=self.event)
+            schedule.set_cells(
+                [
+                    ScheduleCell(role[0], role[1], slot, volunteer)
+                    for volunteer, slots in scheduler.schedule.items()
+                    for slot, role in slots.items()
+                ]
+            )
+
+            runs = schedule.eventscheduleslot_set.all()
+            self.assertEqual(len(runs), 2)
+            for run in runs:
+                self.assertIn(run.end_date - run.start_date, self.role.shift_durations)
+
+    def test_should_return_alternatives(self):
+        self.add_volunteer(
+            "v1", "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+        )
+        self.add_volunteer(
+            "v2", "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+        )
+
+        scheduler = Scheduler(self.event, pool_size=2)
+
+        self.assertIs(scheduler.is_valid, True)
+        first, second = scheduler.solutions
+        self.assertNotEqual(first.schedule, second.schedule)
+        self.assertLessEqual(first.objective, second.objective)
+        self.assertListEqual(second.missing[(self.role, 0)], [])
+
+    def test_should_regroup_friends(self):
+        duo = Role.objects.create(
+            name="duo",
+            event=self.event,
+            occurence=2,
+            start_date=self.event.start_date,
+            end_date=self.event.end_date,
+        )
+        v1 = self.add_volunteer(
+            "v1", "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+        )
+        v2 = self.add_volunteer(
+            "v2", "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+        )
+        v3 = self.add_volunteer(
+            "v3", "2025-06-01T08:00:00+02:00", "2025-06-01T10:00:00+02:00"
+        )
+        v1.friend = v2
+        v1.save()
+        v2.friend = v1
+        v2.save()
+
+        scheduler = Scheduler(self.event)
+        scheduler.friend_mode = FriendMode.AT_BEST
+
+        self.assertIs(scheduler.is_valid, True)
+        for slot in self.event.schedule_slots():
+            self.assertEqual(scheduler.schedule[v1][slot][0], duo)
+            self.assertEqual(scheduler.schedule[v2][slot][0], duo)
+            self.assertEqual(scheduler.schedule[v3][slot], (self.role, 0))
+
+
+class ModelTests(TestCase):
+    def test_should_sum_duplicated_coefficients(self):
+        model = Model()
+        model.add_columns(3)
+        model.add_rows(2, [0, 0, 0, 1], [0, 2, 0, 1], 1, "L", 1)
+        indptr, indices, data = model.to_csr()
+        self.assertListEqual(list(indptr), [0, 2, 3])
+        self.assertListEqual(list(indices), [0, 2, 1])
+        self.assertListEqual(list(data), [2.0, 1.0, 1.0])
+
+    def test_should_solve(self):
+        model = Model()
+        columns = model.add_columns(3, cost=[-1, -2, -3])
+        model.add_grouped_rows([0, 0, 0], columns, 1, "L", 1)
+        model.solve(time_limit=10)
+        self.assertListEqual(list(model.values(columns)), [0.0, 0.0, 1.0])
+
+    def test_should_read_cbc_status(self):
+        model = Model()
+        model.add_columns(1)
+        for line, status in (
+            ("Optimal - objective value -1.00000000", LpStatusOptimal),
+            ("Stopped on time - objective value -1.00000000", LpStatusOptimal),
+            (
+                "Stopped on time - no integer solution - continuous solution",
+                LpStatusNotSolved,
+            ),
+            ("Unbounded - objective value 0.00000000", LpStatusUnbounded),
+            ("Unknown - objective value 0.00000000", LpStatusUndefined),
+        ):
+            model.read_solution(io.StringIO(line + "\n"))
+            self.assertEqual(model.status, status, line)
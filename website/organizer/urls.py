@@ -10,6 +10,11 @@ urlpatterns = [
     path("", login_required(views.IndexView.as_view()), name="index"),
     path("<slug>/", login_required(views.EventView.as_view()), name="event"),
     path("duo/<slug>/", login_required(views.DuoView.as_view()), name="duo"),
+    path(
+        "duo/<slug>/match/",
+        login_required(views.DuoMatchView.as_view()),
+        name="duo_match",
+    ),
     path(
         "planning/<slug>/",
         login_required(views.ScheduleListView.as_view()),
@@ -30,6 +35,16 @@ urlpatterns = [
         login_required(views.ScheduleEditView.as_view()),
         name="schedule_edit",
     ),
+    path(
+        "planning/<slug>/<id>/changes/",
+        login_required(views.ScheduleChangesView.as_view()),
+        name="schedule_changes",
+    ),
+    path(
+        "planning/<slug>/<id>/grid/",
+        login_required(views.ScheduleGridView.as_view()),
+        name="schedule_grid",
+    ),
     path(
         "planning/<slug>/<id>/delete/",
         login_required(views.ScheduleDeleteView.as_view()),
@@ -1,26 +1,44 @@
 import csv
+import json
 import logging
-from datetime import datetime
 
+from django.conf import settings
+from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.http import (
     Http404,
     HttpResponseForbidden,
     HttpResponseRedirect,
+    JsonResponse,
     StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.timezone import now
 from django.views import View, generic
 from event.forms import EventBaseForm, RolesFormSet
 from volunteers.forms import AvailabilityUpdateDeleteFormSet, FriendshipEditForm
-from volunteers.models import VolunteerAvailability, VolunteerSlot
+from volunteers.matching import (
+    apply_matches,
+    friendship_availabilities,
+    match_friendships,
+)
+from volunteers.models import VolunteerAvailability, VolunteerFriendshipWaiting
 
 from .forms import ScheduleEditForm, ScheduleEventHiddenFormSet
-from .models import EventSchedule, EventScheduleSlot, EventWithSchedule
+from .grids import (
+    edit_rows_by_roles,
+    event_volunteers,
+    grid_etag,
+    grid_payload,
+    schedule_grid_payload,
+)
+from .models import EventSchedule, EventWithSchedule, ScheduleCell
 from .scheduling import FriendMode, Scheduler
-from .tasks import send_volunteer_slots
+from .tasks import purge_schedules, send_volunteer_slots
+from .windows import GridWindow
 
 logger = logging.getLogger(__name__)
 
@@ -52,12 +70,11 @@ class ScheduleView(generic.DetailView):
     pk_url_kwarg = "id"
 
     def get_context_data(self, **kwargs):
+        snapshot = self.object.snapshot()
         kwargs = kwargs | {
             "event": self.object.event,
-            "slots": self.object.event.schedule_slots(),
-            "missings": self.object.get_missing_by_slots(),
-            "by_roles": self.object.get_schedule_by_roles(),
-            "by_volunteers": self.object.get_schedule_by_volunteers(),
+            "slots": self.object.event.schedule_grid(),
+            "missings": snapshot.missings,
         }
         return super().get_context_data(**kwargs)
 
@@ -90,29 +107,22 @@ class ScheduleNewView(generic.detail.SingleObjectMixin, generic.TemplateView):
         }
         form = ScheduleEditForm(**self.update_kwargs_with_post(base_kwargs))
 
+        # only kept in memory until the first save
         self.schedule = EventSchedule(
             event=self.object, type=EventSchedule.ScheduleType.EMPTY, deletable=True
         )
-        slots = []
-        for role in self.object.role_set.all():
-            for position in range(0, role.occurence):
-                for slot in role.slots_for_event:
-                    slots.append(
-                        EventScheduleSlot(
-                            schedule=self.schedule,
-                            start_date=slot.start,
-                            end_date=slot.end,
-                            role=role,
-                            position=position,
-                        )
-                    )
-        with transaction.atomic():
-            self.schedule.save()
-            [slot.save() for slot in slots]
+        grid = self.object.schedule_grid()
+        self.cells = [
+            ScheduleCell(role, position, slot)
+            for role in self.object.role_set.order_by("order")
+            for position in range(0, role.occurence)
+            for slot in role.slots_in(grid)
+        ]
 
         slots_kwargs = {
             "prefix": "slots",
-            "instance": self.schedule,
+            "schedule": self.schedule,
+            "cells": self.cells,
         }
         formset = ScheduleEventHiddenFormSet(
             **self.update_kwargs_with_post(slots_kwargs)
@@ -120,31 +130,50 @@ class ScheduleNewView(generic.detail.SingleObjectMixin, generic.TemplateView):
         return {"form": form, "formset": formset}
 
     def get_context_data(self, **kwargs):
+        forms = self.get_forms()
+        grid = self.object.schedule_grid()
+        roles = [
+            x
+            for role in self.object.role_set.order_by("order")
+            for x in zip([role] * role.occurence, range(0, role.occurence))
+        ]
         kwargs = (
             kwargs
-            | self.get_forms()
+            | forms
             | {
                 "event": self.object,
                 "eventschedule": self.schedule,
-                "slots": self.object.schedule_slots(),
-                "roles": [
-                    x
-                    for role in self.object.role_set.order_by("order")
-                    for x in zip([role] * role.occurence, range(0, role.occurence))
-                ],
-                "volunteers": {
-                    v: {"availables": v.slots_for_event, "roles": {}}
-                    for v in self.object.volunteeravailability_set.prefetch_related(
-                        "volunteer"
-                    ).order_by("volunteer__lastname", "volunteer__firstname")
-                },
+                "slots": grid,
+                "role_rows": edit_rows_by_roles(forms["formset"], roles, grid),
+                "grid": grid_payload(
+                    self.object,
+                    grid,
+                    [cell.values for cell in self.cells],
+                    event_volunteers(self.object),
+                ),
             }
         )
         return super().get_context_data(**kwargs)
 
-    def form_valid(self):
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden()
+
+        forms = self.get_forms()
+        if all(form.is_valid() for form in forms.values()):
+            return self.create(forms["form"], forms["formset"])
+        return self.render_to_response(self.get_context_data())
+
+    def create(self, form, formset):
+        for name, value in form.schedule_fields().items():
+            setattr(self.schedule, name, value)
+        with transaction.atomic():
+            self.schedule.save()
+            self.schedule.set_cells(self.cells)
+            self.schedule.apply_changes(formset.get_changes())
+
         return redirect(
-            "organizer:schedule_edit", slug=self.object.event.slug, id=self.object.id
+            "organizer:schedule_edit", slug=self.object.slug, id=self.schedule.id
         )
 
 
@@ -155,12 +184,11 @@ class ScheduleValidateView(generic.edit.DeleteView):
     template_name = "organizer/schedule_confirm_validate.html"
 
     def get_context_data(self, **kwargs):
+        snapshot = self.object.snapshot()
         kwargs = kwargs | {
             "event": self.object.event,
-            "slots": self.object.event.schedule_slots(),
-            "missings": self.object.get_missing_by_slots(),
-            "by_roles": self.object.get_schedule_by_roles(),
-            "by_volunteers": self.object.get_schedule_by_volunteers(),
+            "slots": self.object.event.schedule_grid(),
+            "missings": snapshot.missings,
         }
         return super().get_context_data(**kwargs)
 
@@ -191,7 +219,12 @@ class ScheduleDeleteView(generic.edit.DeleteView):
         can_delete = self.object.can_delete()
 
         if can_delete:
-            return super().form_valid(form)
+            success_url = self.get_success_url()
+            if getattr(settings, "SCHEDULE_PURGE_IN_TASK", False):
+                purge_schedules.delay([self.object.pk])
+            else:
+                EventSchedule.purge(EventSchedule.objects.filter(pk=self.object.pk))
+            return HttpResponseRedirect(success_url)
         else:
             raise Http404("Schedule not found to delete it")
 
@@ -229,9 +262,19 @@ class ScheduleEditView(generic.detail.SingleObjectMixin, generic.TemplateView):
         }
         form = ScheduleEditForm(**self.update_kwargs_with_post(base_kwargs))
 
+        # only the cells of the window are shown, and so saved
+        grid = self.object.event.schedule_grid()
+        self.window = GridWindow(
+            grid, self.request.GET, event_volunteers(self.object.event)
+        )
         slots_kwargs = {
             "prefix": "slots",
-            "instance": self.object,
+            "schedule": self.object,
+            "cells": [
+                cell
+                for cell in self.object.get_cells(grid, self.window.around)
+                if cell.slot in self.window
+            ],
         }
         formset = ScheduleEventHiddenFormSet(
             **self.update_kwargs_with_post(slots_kwargs)
@@ -239,33 +282,22 @@ class ScheduleEditView(generic.detail.SingleObjectMixin, generic.TemplateView):
         return {"form": form, "formset": formset}
 
     def get_context_data(self, **kwargs):
+        forms = self.get_forms()
+        roles = [
+            x
+            for role in self.object.event.role_set.order_by("order")
+            for x in zip([role] * role.occurence, range(0, role.occurence))
+        ]
         kwargs = (
             kwargs
-            | self.get_forms()
+            | forms
             | {
                 "event": self.object.event,
-                "slots": self.object.event.schedule_slots(),
-                "roles": [
-                    x
-                    for role in self.object.event.role_set.order_by("order")
-                    for x in zip([role] * role.occurence, range(0, role.occurence))
-                ],
-                "volunteers": {
-                    v: {
-                        "availables": v.slots_for_event,
-                        "roles": {
-                            s.slot: s
-                            for s in v.eventscheduleslot_set.filter(
-                                schedule=self.object
-                            ).order_by("start_date")
-                        },
-                    }
-                    for v in self.object.event.volunteeravailability_set.prefetch_related(
-                        "volunteer"
-                    ).order_by(
-                        "volunteer__lastname", "volunteer__firstname"
-                    )
-                },
+                "slots": self.window.slots,
+                "window": self.window,
+                "role_rows": edit_rows_by_roles(
+                    forms["formset"], roles, self.window.slots
+                ),
             }
         )
         return super().get_context_data(**kwargs)
@@ -290,40 +322,96 @@ class ScheduleEditView(generic.detail.SingleObjectMixin, generic.TemplateView):
         return self.render_to_response(self.get_context_data())
 
     def update(self, form, formset):
+        fields = form.schedule_fields()
         with transaction.atomic():
             no_update = (
                 "no_update" in form.cleaned_data and form.cleaned_data["no_update"]
             )
             if no_update:
-                self.object.id = None
-                self.object.saved_at = datetime.now()
-            if form.cleaned_data["name"]:
-                self.object.name = form.cleaned_data["name"]
-            if "as_base" in form.cleaned_data and form.cleaned_data["as_base"]:
-                self.object.type = EventSchedule.ScheduleType.BASE
-            else:
-                self.object.type = EventSchedule.ScheduleType.USER
-            if "no_delete" in form.cleaned_data and form.cleaned_data["no_delete"]:
-                self.object.deletable = False
+                self.object = self.object.branch(**fields)
             else:
-                self.object.deletable = True
-
-            self.object.save()
-
-            formset.save(commit=False)
-            forms = formset.forms if no_update else formset.saved_forms
-            for subform in forms:
-                if no_update:
-                    subform.instance.id = None
-                subform.instance.schedule = self.object
-                subform.instance.save()
+                for name, value in fields.items():
+                    setattr(self.object, name, value)
+                self.object.save()
+            self.object.apply_changes(formset.get_changes())
 
         return self.form_valid()
 
     def form_valid(self):
-        return redirect(
-            "organizer:schedule_edit", slug=self.object.event.slug, id=self.object.id
+        url = reverse(
+            "organizer:schedule_edit",
+            kwargs={"slug": self.object.event.slug, "id": self.object.id},
         )
+        return redirect(f"{url}?{self.window.query}")
+
+
+class ScheduleChangesView(generic.detail.SingleObjectMixin, View):
+    """Apply the cells changed in the editor, sent as JSON:
+    {"changes": [{"cell": "<role>-<position>-<slot>", "volunteer": id or null}]}
+    """
+
+    model = EventSchedule
+    pk_field = "id"
+    pk_url_kwarg = "id"
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden()
+        self.object = self.get_object()
+        if self.object.validated_at is not None:
+            return HttpResponseForbidden()
+
+        try:
+            changes = {
+                ScheduleCell.parse_key(change["cell"]): (
+                    None if change["volunteer"] is None else int(change["volunteer"])
+                )
+                for change in json.loads(request.body)["changes"]
+            }
+            cells = self.object.apply_changes(changes)
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({"errors": ["Requête invalide."]}, status=400)
+        except ValidationError as e:
+            return JsonResponse({"errors": e.messages}, status=400)
+
+        return JsonResponse(
+            {
+                "modified_at": self.object.modified_at.isoformat(),
+                "cells": [
+                    {
+                        "cell": cell.key,
+                        "volunteer": cell.volunteer.id if cell.volunteer else None,
+                    }
+                    for cell in cells
+                ],
+            }
+        )
+
+
+class ScheduleGridView(generic.detail.SingleObjectMixin, View):
+    """The grid of a schedule as JSON, revalidated by the browser with its
+    ETag. The parameters of a GridWindow restrict it to a window."""
+
+    model = EventSchedule
+    pk_field = "id"
+    pk_url_kwarg = "id"
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        window = None
+        if request.GET:
+            window = GridWindow(
+                self.object.event.schedule_grid(),
+                request.GET,
+                event_volunteers(self.object.event),
+            )
+        etag = grid_etag(self.object)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse(schedule_grid_payload(self.object, etag, window))
+        response.headers["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 class ScheduleGenerateView(generic.detail.SingleObjectMixin, View):
@@ -339,39 +427,10 @@ class ScheduleGenerateView(generic.detail.SingleObjectMixin, View):
         scheduler.friend_mode = FriendMode.AT_BEST
         if scheduler.is_valid:
             with transaction.atomic():
-                schedule = EventSchedule(
-                    event=self.object,
-                    based_on=self.base,
-                    type=EventSchedule.ScheduleType.GENERATED,
-                )
-
-                schedule_slots = []
-                for volunteer, slots in scheduler.schedule.items():
-                    for slot, role in slots.items():
-                        schedule_slots.append(
-                            EventScheduleSlot(
-                                schedule=schedule,
-                                volunteer=volunteer,
-                                start_date=slot.start,
-                                end_date=slot.end,
-                                role=role[0],
-                                position=role[1],
-                            )
-                        )
-                for role, slots in scheduler.missing.items():
-                    for slot in slots:
-                        schedule_slots.append(
-                            EventScheduleSlot(
-                                schedule=schedule,
-                                start_date=slot.start,
-                                end_date=slot.end,
-                                role=role[0],
-                                position=role[1],
-                            )
-                        )
-
-                schedule.save()
-                EventScheduleSlot.objects.bulk_create(schedule_slots)
+                schedules = [
+                    self.save_solution(solution) for solution in scheduler.solutions
+                ]
+            schedule = schedules[0]
 
             return HttpResponseRedirect(
                 reverse(
@@ -383,6 +442,28 @@ class ScheduleGenerateView(generic.detail.SingleObjectMixin, View):
             reverse("organizer:schedule", kwargs={"slug": self.object.slug})
         )
 
+    def save_solution(self, solution):
+        schedule = EventSchedule(
+            event=self.object,
+            based_on=self.base,
+            type=EventSchedule.ScheduleType.GENERATED,
+            objective=solution.objective,
+        )
+
+        cells = [
+            ScheduleCell(role[0], role[1], slot, volunteer)
+            for volunteer, slots in solution.schedule.items()
+            for slot, role in slots.items()
+        ] + [
+            ScheduleCell(role[0], role[1], slot)
+            for role, slots in solution.missing.items()
+            for slot in slots
+        ]
+
+        schedule.save()
+        schedule.set_cells(cells)
+        return schedule
+
 
 class Echo:
     def write(self, value):
@@ -455,12 +536,16 @@ class DuoView(generic.detail.SingleObjectMixin, generic.FormView):
     def get_form(self, form_class=None):
         if form_class is None:
             form_class = self.get_form_class()
-            self.initial["event"] = self.get_object()
+            self.initial["event"] = self.object
         return form_class(**self.get_form_kwargs())
 
     def get_context_data(self, **kwargs):
         self.object = self.get_object()
-        return super().get_context_data(**kwargs)
+        context = super().get_context_data(**kwargs)
+        context["matches"], context["ambiguous"] = match_friendships(
+            context["form"].availabilities.values()
+        )
+        return context
 
     def get_success_url(self):
         return reverse("organizer:duo", kwargs={"slug": self.object.slug})
@@ -475,39 +560,39 @@ class DuoView(generic.detail.SingleObjectMixin, generic.FormView):
         return self.form_invalid(form)
 
     def form_valid(self, form):
+        friends = []
+        unwaited = []
+        for key, value in form.cleaned_data.items():
+            if key in ["slug", "captcha"] or not value:
+                continue
+            availability = form.availabilities[int(key)]
+            unwaited.append(availability.id)
+            if value != "sup" and int(value) != availability.friend_id:
+                availability.friend_id = int(value)
+                friends.append(availability)
         with transaction.atomic():
-            for key, value in form.cleaned_data.items():
-                if key in ["slug", "captcha"] or not value:
-                    continue
-                elif key.endswith("_delete"):
-                    va = VolunteerAvailability.objects.get(
-                        pk=int(key.removesuffix("_delete"))
-                    )
-                    va.delete()
-                else:
-                    va = VolunteerAvailability.objects.get(pk=int(key))
-                    if value == "sup":
-                        try:
-                            va.volunteerfriendshipwaiting.delete()
-                        except (
-                            VolunteerAvailability.volunteerfriendshipwaiting.RelatedObjectDoesNotExist
-                        ):
-                            pass
-                    else:
-                        va.friend = VolunteerAvailability.objects.get(pk=int(value))
-
-                        try:
-                            if value is not None:
-                                va.volunteerfriendshipwaiting.delete()
-                        except (
-                            VolunteerAvailability.volunteerfriendshipwaiting.RelatedObjectDoesNotExist
-                        ):
-                            pass
-                        va.save()
+            VolunteerFriendshipWaiting.objects.filter(
+                volunteeravailability_id__in=unwaited
+            ).delete()
+            VolunteerAvailability.objects.bulk_update(friends, ["friend"])
 
         return super().form_valid(form)
 
 
+class DuoMatchView(generic.detail.SingleObjectMixin, View):
+    model = EventWithSchedule
+
+    def post(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        matches, ambiguous = match_friendships(friendship_availabilities(self.object))
+        apply_matches(matches)
+        messages.success(
+            request,
+            f"{len(matches)} demandes de duo associées, {len(ambiguous)} à vérifier.",
+        )
+        return redirect("organizer:duo", slug=self.object.slug)
+
+
 class EventView(generic.DetailView):
     model = EventWithSchedule
     context_object_name = "event"
@@ -602,16 +687,20 @@ class AvailabilityUpdate(generic.detail.SingleObjectMixin, generic.TemplateView)
         }
         form = EventBaseForm(**self.update_kwargs_with_post(base_kwargs))
 
+        self.window = GridWindow(
+            self.object.schedule_grid(),
+            self.request.GET,
+            self.object.volunteeravailability_set.select_related(
+                "volunteer", "friend__volunteer"
+            )
+            .prefetch_related("volunteerslot_set", "categories")
+            .order_by("volunteer__lastname", "volunteer__firstname", "volunteer_id"),
+        )
         availability_kwargs = {
             "prefix": "availability",
-            "initial": [
-                {"availability": av}
-                for av in self.object.volunteeravailability_set.prefetch_related(
-                    "volunteer", "friend", "event"
-                )
-                .order_by("volunteer__lastname", "volunteer__firstname")
-                .all()
-            ],
+            "availabilities": self.window.page.object_list,
+            "grid": self.window.slots,
+            "categories": self.object.rolecategory_set.order_by("name"),
         }
         formset = AvailabilityUpdateDeleteFormSet(
             **self.update_kwargs_with_post(availability_kwargs)
@@ -619,7 +708,11 @@ class AvailabilityUpdate(generic.detail.SingleObjectMixin, generic.TemplateView)
         return {"form": form, "formset": formset}
 
     def get_context_data(self, **kwargs):
-        kwargs = kwargs | self.get_forms()
+        kwargs = (
+            kwargs
+            | self.get_forms()
+            | {"slots": self.window.slots, "window": self.window}
+        )
         return super().get_context_data(**kwargs)
 
     def post(self, request, *args, **kwargs):
@@ -639,36 +732,35 @@ class AvailabilityUpdate(generic.detail.SingleObjectMixin, generic.TemplateView)
         return self.render_to_response(self.get_context_data())
 
     def update(self, formset):
-        if formset.has_changed():
-            with transaction.atomic():
-                for form in formset:
-                    if "DELETE" in form.cleaned_data and form.cleaned_data["DELETE"]:
-                        va = VolunteerAvailability.objects.get(
-                            pk=form.cleaned_data["availability_id"]
-                        )
-                        logger.info(f"Deleting {va.id}")
-                        va.delete()
-                    elif form.has_changed() and form.initial:
-                        va = VolunteerAvailability.objects.get(
-                            pk=form.cleaned_data["availability_id"]
-                        )
-                        logger.info(f"Updating {va.id}")
-                        va.volunteerslot_set.clear()
-                        slots = [
-                            VolunteerSlot(
-                                availability=va,
-                                start_date=slot.start,
-                                end_date=slot.end,
-                            )
-                            for slot in form.cleaned_data["slots"]
-                        ]
-                        va.categories.set(form.cleaned_data["categories"])
-                        [s.save() for s in slots]
-
-                        va.maxslot = len(slots)
-                        va.save()
+        if not formset.has_changed():
+            return self.form_valid()
+
+        # only the availabilities of the page can be changed
+        availabilities = {va.id: va for va in formset.availabilities}
+        grid = self.object.schedule_grid()
+        deleted, slots, categories = [], {}, {}
+        for form in formset:
+            va = availabilities.get(form.cleaned_data.get("availability_id"))
+            if va is None:
+                continue
+            if form.cleaned_data.get("DELETE"):
+                deleted.append(va.id)
+            elif form.has_changed():
+                slots[va] = self.window.replace(
+                    va.availability, form.cleaned_data["slots"]
+                )
+                categories[va] = form.cleaned_data["categories"]
+                va.maxslot = len(slots[va].covered(grid))
+
+        logger.info(f"Deleting {deleted}, updating {[va.id for va in slots]}")
+        with transaction.atomic():
+            VolunteerAvailability.objects.filter(pk__in=deleted).delete()
+            VolunteerAvailability.bulk_set_slots(slots)
+            VolunteerAvailability.bulk_set_categories(categories)
+            VolunteerAvailability.objects.bulk_update(slots, ["maxslot"])
 
         return self.form_valid()
 
     def form_valid(self):
-        return redirect("organizer:volunteers", slug=self.object.slug)
+        url = reverse("organizer:volunteers", kwargs={"slug": self.object.slug})
+        return redirect(f"{url}?{self.window.query}")
@@ -0,0 +1,128 @@
+import logging
+from datetime import datetime, time, timedelta
+
+from common.fields import IntervalSet, Slot
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import urlencode
+from django.utils.timezone import is_naive, localtime, make_aware
+
+logger = logging.getLogger(__name__)
+
+
+class GridWindow:
+    """The part of an event grid a page works on: the slots of one day, or of
+    a ``start``/``end`` range, and one page of the volunteers."""
+
+    def __init__(self, grid, params, volunteers, per_page=None):
+        self.days = self._days(grid)
+        self.day = None
+        self.range = None
+        start, end = self._bounds(params)
+        self.slots = grid.within(Slot(start, end)) if start is not None else []
+        self.index = {slot: idx for idx, slot in enumerate(self.slots)}
+        if per_page is None:
+            per_page = getattr(settings, "SCHEDULE_VOLUNTEERS_PER_PAGE", 50)
+        self.page = Paginator(volunteers, per_page).get_page(params.get("page"))
+
+    @staticmethod
+    def _days(grid):
+        if not len(grid):
+            return []
+        day = localtime(grid[0].start).date()
+        last = localtime(grid[-1].end - timedelta(microseconds=1)).date()
+        days = []
+        while day <= last:
+            days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def _datetime(value):
+        try:
+            value = parse_datetime(value or "")
+        except ValueError:
+            return None
+        if value is not None and is_naive(value):
+            value = make_aware(value)
+        return value
+
+    def _bounds(self, params):
+        start = self._datetime(params.get("start"))
+        end = self._datetime(params.get("end"))
+        if start is not None and end is not None and start < end:
+            self.range = (start, end)
+            return start, end
+        try:
+            day = parse_date(params.get("day") or "")
+        except ValueError:
+            day = None
+        if day not in self.days:
+            day = self.days[0] if self.days else None
+        if day is None:
+            return None, None
+        self.day = day
+        start = make_aware(datetime.combine(day, time.min))
+        return start, make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+    def __contains__(self, slot):
+        return slot in self.index
+
+    @property
+    def span(self):
+        if not self.slots:
+            return None
+        return Slot(self.slots[0].start, self.slots[-1].end)
+
+    @property
+    def around(self):
+        """Filter of the shifts crossing the window."""
+        span = self.span
+        if span is None:
+            return Q(pk__in=[])
+        return Q(start_date__lt=span.end, end_date__gt=span.start)
+
+    def replace(self, intervals, slots):
+        """Return the IntervalSet ``intervals`` with its part in the window
+        replaced by ``slots``, what is out of the window is kept."""
+        if self.span is not None:
+            intervals = intervals - IntervalSet([self.span])
+        return intervals | IntervalSet(slots)
+
+    @property
+    def params(self):
+        if self.range is not None:
+            return {
+                "start": self.range[0].isoformat(),
+                "end": self.range[1].isoformat(),
+            }
+        return {"day": self.day.isoformat()} if self.day else {}
+
+    @property
+    def query(self):
+        return urlencode(self.params | {"page": self.page.number})
+
+    @property
+    def days_nav(self):
+        return [
+            (
+                day,
+                urlencode({"day": day.isoformat(), "page": self.page.number}),
+                day == self.day,
+            )
+            for day in self.days
+        ]
+
+    @property
+    def previous_query(self):
+        if not self.page.has_previous():
+            return None
+        return urlencode(self.params | {"page": self.page.previous_page_number()})
+
+    @property
+    def next_query(self):
+        if not self.page.has_next():
+            return None
+        return urlencode(self.params | {"page": self.page.next_page_number()})
@@ -1,9 +1,10 @@
 import logging
 
-from common.fields import SlotsField
+from common.fields import SlotsMaskField
 from django import forms
 from event.forms import EventBaseForm
 
+from .matching import friendship_availabilities, waiting_friendship
 from .models import Volunteer, VolunteerAvailability
 
 logger = logging.getLogger(__name__)
@@ -11,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 class AvailabilityUpdateDeleteForm(forms.Form):
     availability_id = forms.IntegerField(widget=forms.HiddenInput())
-    slots = SlotsField(required=False, choices=[])
+    slots = SlotsMaskField(required=False)
     categories = forms.MultipleChoiceField(
         required=False, widget=forms.CheckboxSelectMultiple, choices=[]
     )
@@ -20,77 +21,105 @@ class AvailabilityUpdateDeleteForm(forms.Form):
         super().__init__(*args, **kwargs)
 
         if "initial" in kwargs and "slots_choices" in kwargs["initial"]:
-            self.fields["slots"].choices = kwargs["initial"]["slots_choices"]
+            self.fields["slots"].grid = kwargs["initial"]["slots_choices"]
         self.availability = None
         if "initial" in kwargs and "availability" in kwargs["initial"]:
             self.availability = kwargs["initial"]["availability"]
             self.fields["availability_id"].initial = self.availability.id
-            self.fields["slots"].choices = [
-                (str(s), s) for s in self.availability.event.schedule_slots()
-            ]
-            slots = [
-                slot
-                for slot in self.availability.event.schedule_slots()
-                if any(
-                    slot.is_contained_by(s.slot)
-                    for s in self.availability.volunteerslot_set.all()
-                )
-            ]
-            self.fields["slots"].initial = slots
-            self.fields["categories"].choices = [
-                (c.id, c.name)
-                for c in self.availability.event.rolecategory_set.order_by("name").all()
-            ]
+            grid = kwargs["initial"].get("grid")
+            if grid is None:
+                grid = self.availability.event.volunteer_grid()
+            self.fields["slots"].grid = grid
+            self.fields["slots"].initial = self.availability.slots_in(grid)
+            choices = kwargs["initial"].get("categories_choices")
+            if choices is None:
+                choices = [
+                    (c.id, c.name)
+                    for c in self.availability.event.rolecategory_set.order_by("name")
+                ]
+            self.fields["categories"].choices = choices
             self.fields["categories"].initial = [
                 c.id for c in self.availability.categories.all()
             ]
 
 
+class BaseAvailabilityUpdateDeleteFormSet(forms.BaseFormSet):
+    """Forms of ``availabilities``, prefetched with their slots and categories,
+    sharing one ``grid`` and one list of ``categories``."""
+
+    def __init__(self, *args, availabilities=(), grid=None, categories=(), **kwargs):
+        self.availabilities = list(availabilities)
+        choices = [(category.id, category.name) for category in categories]
+        kwargs["initial"] = [
+            {"availability": availability, "grid": grid, "categories_choices": choices}
+            for availability in self.availabilities
+        ]
+        super().__init__(*args, **kwargs)
+
+
 AvailabilityUpdateDeleteFormSet = forms.formset_factory(
-    AvailabilityUpdateDeleteForm, can_delete=True, extra=0
+    AvailabilityUpdateDeleteForm,
+    formset=BaseAvailabilityUpdateDeleteFormSet,
+    can_delete=True,
+    extra=0,
 )
 
 
+class FriendSelect(forms.Select):
+    """Select of a friend rendering only its own choices, the list of all the
+    volunteers is shared by the page and added by the browser."""
+
+    def __init__(self, attrs=None, choices=()):
+        super().__init__(attrs, choices)
+        self.attrs.setdefault("data-friends", "shared")
+
+
+class FriendChoiceField(forms.ChoiceField):
+    """Friend of ``availability`` among ``friends``, a mapping of the ids of
+    the availabilities of the event to their label shared by all the fields."""
+
+    widget = FriendSelect
+
+    def __init__(self, *, availability, friends, **kwargs):
+        self.availability = availability
+        self.friends = friends
+        choices = [("", "---------")]
+        if waiting_friendship(availability) is not None:
+            choices.append(("sup", "~~~~ supprimer ~~~~"))
+        if availability.friend_id is not None:
+            key = str(availability.friend_id)
+            choices.append((key, friends.get(key, key)))
+        super().__init__(choices=choices, initial=availability.friend_id, **kwargs)
+
+    def valid_value(self, value):
+        if value in ("", "sup"):
+            return super().valid_value(value)
+        return value in self.friends and value != str(self.availability.id)
+
+
 class FriendshipEditForm(EventBaseForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.label_suffix = ""
+        self.availabilities = {}
+        self.friend_choices = []
 
         if self.event is not None:
-            queryset_availabilities = (
-                self.event.volunteeravailability_set.prefetch_related("volunteer")
-                .order_by("volunteer__lastname", "volunteer__firstname")
-                .all()
-            )
-            for availability in queryset_availabilities:
-                choices = [("", "---------")]
-                try:
-                    if availability.volunteerfriendshipwaiting:
-                        choices.append(("sup", "~~~~ supprimer ~~~~"))
-                except (
-                    VolunteerAvailability.volunteerfriendshipwaiting.RelatedObjectDoesNotExist
-                ):
-                    pass
-                choices += [
-                    (V.id, str(V.volunteer))
-                    for V in queryset_availabilities.exclude(pk=availability.id).all()
-                ]
-                self.fields[str(availability.id)] = forms.ChoiceField(
+            for availability in friendship_availabilities(self.event):
+                self.availabilities[availability.id] = availability
+                self.friend_choices.append(
+                    [str(availability.id), str(availability.volunteer)]
+                )
+            friends = dict(self.friend_choices)
+            for availability in self.availabilities.values():
+                self.fields[str(availability.id)] = FriendChoiceField(
                     label=str(availability.volunteer),
-                    choices=choices,
                     required=False,
-                    initial=(
-                        (availability.friend.id, availability.friend)
-                        if availability.friend is not None
-                        else None
-                    ),
-                    widget=forms.Select(attrs={"class": "form-control"}),
+                    availability=availability,
+                    friends=friends,
+                    widget=FriendSelect(attrs={"class": "form-control"}),
                 )
-                self.fields[str(availability.id)].label_from_instance = (
-                    lambda obj: obj.volunteer
-                )
-                self.fields[str(availability.id)].availability = availability
 
 
 class RegisterVolunteerForm(EventBaseForm):
@@ -100,7 +129,7 @@ class RegisterVolunteerForm(EventBaseForm):
     phone = forms.CharField(max_length=20)
     friend_firstname = forms.CharField(max_length=100, required=False)
     friend_lastname = forms.CharField(max_length=100, required=False)
-    slots = SlotsField()
+    slots = SlotsMaskField()
     notes = forms.CharField(widget=forms.Textarea(attrs={"rows": "5"}), required=False)
 
     def __init__(self, *args, **kwargs):
@@ -113,9 +142,7 @@ class RegisterVolunteerForm(EventBaseForm):
                 self.fields["convention"].required = is_required
                 self.fields["convention"].widget.required = is_required
         if "initial" in kwargs and "slots_choices" in kwargs["initial"]:
-            self.fields["slots"].choices = [
-                (str(slot), slot) for slot in kwargs["initial"]["slots_choices"]
-            ]
+            self.fields["slots"].grid = kwargs["initial"]["slots_choices"]
 
         for visible in self.visible_fields():
             if visible.name != "convention":
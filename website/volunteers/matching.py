@@ -0,0 +1,129 @@
+import difflib
+import logging
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import VolunteerAvailability, VolunteerFriendshipWaiting
+
+logger = logging.getLogger(__name__)
+
+Match = namedtuple("Match", ["availability", "friend", "score"])
+
+
+def normalize(name):
+    """``name`` casefolded, without accents nor punctuation, and with its words
+    sorted so that first and last names match in any order."""
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(
+        c if c.isalnum() else " " for c in name if not unicodedata.combining(c)
+    )
+    return " ".join(sorted(name.split()))
+
+
+def waiting_friendship(availability):
+    try:
+        return availability.volunteerfriendshipwaiting
+    except VolunteerAvailability.volunteerfriendshipwaiting.RelatedObjectDoesNotExist:
+        return None
+
+
+def friendship_availabilities(event):
+    return event.volunteeravailability_set.select_related(
+        "volunteer", "volunteerfriendshipwaiting"
+    ).order_by("volunteer__lastname", "volunteer__firstname", "id")
+
+
+class NameIndex:
+    """Availabilities by the normalized name of their volunteer, with the
+    names by word so that close names are only looked for among the names
+    sharing a word."""
+
+    def __init__(self, availabilities):
+        self.names = defaultdict(list)
+        self.words = defaultdict(set)
+        for availability in availabilities:
+            volunteer = availability.volunteer
+            name = normalize(f"{volunteer.firstname} {volunteer.lastname}")
+            self.names[name].append(availability)
+            for word in name.split():
+                self.words[word].add(name)
+
+    def find(self, availability, cutoff):
+        """Return the candidates to the friendship asked by ``availability``
+        and the similarity of their name, exact names first then close ones."""
+        waiting = availability.volunteerfriendshipwaiting
+        name = normalize(f"{waiting.firstname} {waiting.lastname}")
+        found = [
+            other for other in self.names.get(name, []) if other.id != availability.id
+        ]
+        if found:
+            return found, 1.0
+        names = set().union(*(self.words.get(word, ()) for word in name.split()))
+        close = difflib.get_close_matches(name, names, n=3, cutoff=cutoff)
+        found = [
+            other
+            for key in close
+            for other in self.names[key]
+            if other.id != availability.id
+        ]
+        if not found:
+            return [], 0.0
+        return found, difflib.SequenceMatcher(None, name, close[0]).ratio()
+
+
+def match_friendships(availabilities, cutoff=None):
+    """Resolve the waiting friendships of ``availabilities`` in one pass.
+
+    Return the matches, with a single candidate not claimed by another
+    volunteer, and the requests left to review by hand with their candidates.
+    """
+    if cutoff is None:
+        cutoff = getattr(settings, "FRIENDSHIP_MATCH_CUTOFF", 0.85)
+    availabilities = list(availabilities)
+    index = NameIndex(availabilities)
+    proposals = {}
+    ambiguous = []
+    for availability in availabilities:
+        if availability.friend_id is not None:
+            continue
+        if waiting_friendship(availability) is None:
+            continue
+        found, score = index.find(availability, cutoff)
+        if len(found) == 1:
+            proposals[availability.id] = Match(availability, found[0], score)
+        else:
+            ambiguous.append((availability, found))
+
+    claims = Counter(match.friend.id for match in proposals.values())
+    matches = []
+    for match in proposals.values():
+        source, friend = match.availability, match.friend
+        partner = proposals.get(friend.id)
+        mutual = partner is not None and partner.friend.id == source.id
+        if friend.friend_id not in (None, source.id) or (
+            not mutual and (partner is not None or claims[friend.id] > 1)
+        ):
+            ambiguous.append((source, [friend]))
+        else:
+            matches.append(match)
+    logger.debug(f"{len(matches)} friendships matched, {len(ambiguous)} to review")
+    return matches, ambiguous
+
+
+def apply_matches(matches):
+    """Link both volunteers of each match and delete the resolved requests,
+    with one delete and one bulk update."""
+    linked = {}
+    for match in matches:
+        match.availability.friend_id = match.friend.id
+        match.friend.friend_id = match.availability.id
+        linked[match.availability.id] = match.availability
+        linked[match.friend.id] = match.friend
+    with transaction.atomic():
+        VolunteerFriendshipWaiting.objects.filter(
+            volunteeravailability_id__in=[match.availability.id for match in matches]
+        ).delete()
+        VolunteerAvailability.objects.bulk_update(list(linked.values()), ["friend"])
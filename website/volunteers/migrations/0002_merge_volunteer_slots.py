@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+def merge_volunteer_slots(apps, schema_editor):
+    VolunteerSlot = apps.get_model("volunteers", "VolunteerSlot")
+
+    # rows detached by the old related manager clear() are unreachable
+    VolunteerSlot.objects.filter(availability__isnull=True).delete()
+
+    merged = {}
+    to_delete = []
+    current = None
+    for row in VolunteerSlot.objects.order_by(
+        "availability_id", "start_date", "end_date"
+    ).iterator():
+        if (
+            current is not None
+            and current.availability_id == row.availability_id
+            and row.start_date <= current.end_date
+        ):
+            if row.end_date > current.end_date:
+                current.end_date = row.end_date
+                merged[current.id] = current
+            to_delete.append(row.id)
+            continue
+        current = row
+
+    VolunteerSlot.objects.bulk_update(merged.values(), ["end_date"], batch_size=1000)
+    for idx in range(0, len(to_delete), 1000):
+        batch = to_delete[idx : idx + 1000]  # noqa: E203
+        VolunteerSlot.objects.filter(id__in=batch).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("volunteers", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_volunteer_slots, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,12 @@
 import logging
 from datetime import timedelta
 
-from common.fields import Slot
+from common.fields import IntervalSet, Slot, slot_grid
 from django.conf import settings
 from django.db import models
-from event.models import Event, RoleCategory
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from event.models import Event, RoleCategory, touch_events
 from phonenumber_field.modelfields import PhoneNumberField
 
 logger = logging.getLogger(__name__)
@@ -54,11 +56,14 @@ class EventWithVolunteers(Event):
 
     convention = models.FileField(upload_to=event_directory_path, null=True, blank=True)
 
-    def volunteer_slots(self):
-        return Slot.create_slots(
-            self.slot_duration_volunteer, self.start_date, self.end_date
+    def volunteer_grid(self):
+        return slot_grid(
+            self.pk, self.slot_duration_volunteer, self.start_date, self.end_date
         )
 
+    def volunteer_slots(self):
+        return list(self.volunteer_grid())
+
     def has_waiting_friendship(self):
         return VolunteerFriendshipWaiting.objects.filter(
             volunteeravailability__event=self
@@ -93,13 +98,51 @@ class VolunteerAvailability(models.Model):
         return [av.slot for av in self.volunteerslot_set.all()]
 
     @property
-    def slots_for_event(self):
-        slots = self.slots
-        return [
-            slot
-            for slot in self.event.schedule_slots()
-            if any(slot.is_contained_by(s) for s in slots)
-        ]
+    def availability(self):
+        return IntervalSet(self.slots)
+
+    def set_slots(self, slots):
+        # stored as merged intervals, one row by contiguous availability
+        self.volunteerslot_set.all().delete()
+        VolunteerSlot.objects.bulk_create(
+            VolunteerSlot(availability=self, start_date=slot.start, end_date=slot.end)
+            for slot in IntervalSet(slots)
+        )
+        # bulk_create sends no post_save
+        touch_events([self.event_id])
+
+    def slots_in(self, grid):
+        return self.availability.covered(grid)
+
+    @staticmethod
+    def bulk_set_slots(slots_by_availability):
+        """Replace the slots of many availabilities with one delete and one
+        insert."""
+        VolunteerSlot.objects.filter(
+            availability__in=list(slots_by_availability)
+        ).delete()
+        VolunteerSlot.objects.bulk_create(
+            VolunteerSlot(
+                availability=availability, start_date=slot.start, end_date=slot.end
+            )
+            for availability, slots in slots_by_availability.items()
+            for slot in IntervalSet(slots)
+        )
+        touch_events(availability.event_id for availability in slots_by_availability)
+
+    @staticmethod
+    def bulk_set_categories(categories_by_availability):
+        """Replace the categories of many availabilities with one delete and
+        one insert."""
+        through = VolunteerAvailability.categories.through
+        through.objects.filter(
+            volunteeravailability__in=list(categories_by_availability)
+        ).delete()
+        through.objects.bulk_create(
+            through(volunteeravailability=availability, rolecategory_id=int(category))
+            for availability, categories in categories_by_availability.items()
+            for category in categories
+        )
 
     def __lt__(self, other):
         if not isinstance(other, VolunteerAvailability):
@@ -135,3 +178,43 @@ class VolunteerFriendshipWaiting(models.Model):
 
     def __str__(self):
         return f"{self.lastname} {self.firstname}"
+
+
+@receiver(post_save, sender=Volunteer)
+def touch_volunteer_events(sender, instance, created=False, **kwargs):
+    # its delete cascades to its availabilities, which touch their event
+    if not created:
+        touch_events(
+            instance.volunteeravailability_set.values_list("event_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=VolunteerAvailability)
+@receiver(post_delete, sender=VolunteerAvailability)
+def touch_availability_event(sender, instance, **kwargs):
+    touch_events([instance.event_id])
+
+
+@receiver(post_save, sender=VolunteerSlot)
+def touch_slot_event(sender, instance, **kwargs):
+    if instance.availability_id is not None:
+        touch_events([instance.availability.event_id])
+
+
+@receiver(pre_delete, sender=VolunteerSlot)
+def touch_deleted_slots_event(sender, instance, origin=None, **kwargs):
+    # once for all the deleted slots, the ones deleted with their
+    # availability are touched by it
+    if getattr(origin, "_events_touched", False):
+        return
+    if isinstance(origin, models.QuerySet) and origin.model is VolunteerSlot:
+        touch_events(
+            VolunteerAvailability.objects.filter(volunteerslot__in=origin)
+            .values_list("event_id", flat=True)
+            .distinct()
+        )
+    elif origin is instance and instance.availability_id is not None:
+        touch_events([instance.availability.event_id])
+    else:
+        return
+    origin._events_touched = True
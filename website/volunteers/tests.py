@@ -1,9 +1,16 @@
 from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from common.fields import Slot
 from django.test import TestCase
 from django.urls import reverse
 
+from .matching import (
+    apply_matches,
+    friendship_availabilities,
+    match_friendships,
+    normalize,
+)
 from .models import (
     EventWithVolunteers,
     Volunteer,
@@ -29,6 +36,32 @@ class RegisterVolunteer(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "volunteers/register.html")
 
+    @patch("django_recaptcha.fields.ReCaptchaField.validate")
+    def test_should_register_slots_from_mask(self, mock):
+        grid = self.event.volunteer_grid()
+        data = {
+            "slug": "name",
+            "captcha": "captcha",
+            "firstname": "Jean",
+            "lastname": "Dupont",
+            "email": "jean@example.com",
+            "phone": "0600000000",
+            "convention": "on",
+            # bits 0 and 2: first and third slots
+            "slots": "5",
+        }
+
+        response = self.client.post(
+            reverse("volunteers:register", kwargs={"slug": "name"}), data
+        )
+
+        self.assertRedirects(
+            response, reverse("volunteers:thanks", kwargs={"slug": "name"})
+        )
+        availability = VolunteerAvailability.objects.get(event=self.event)
+        self.assertEqual(availability.maxslot, 2)
+        self.assertListEqual(availability.slots, [grid[0], grid[2]])
+
 
 class EventWithVolunteersModelTests(TestCase):
 
@@ -105,3 +138,88 @@ class EventWithVolunteersModelTests(TestCase):
 
         self.assertIs(evt1.has_waiting_friendship(), False)
         self.assertIs(evt2.has_waiting_friendship(), True)
+
+
+class VolunteerAvailabilityModelTests(TestCase):
+    def test_should_store_merged_slots(self):
+        event = EventWithVolunteers.objects.create(
+            name="evt",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T18:00:00+02:00"),
+            slot_duration_volunteer=timedelta(hours=2),
+        )
+        volunteer = Volunteer.objects.create(
+            firstname="p1", lastname="n1", email="test@test.com"
+        )
+        availability = VolunteerAvailability.objects.create(
+            event=event, volunteer=volunteer
+        )
+        slots = event.volunteer_slots()
+
+        availability.set_slots([slots[0], slots[1], slots[3]])
+
+        self.assertListEqual(
+            availability.slots, [Slot(slots[0].start, slots[1].end), slots[3]]
+        )
+        self.assertIs(
+            availability.is_available_at(slots[0].start, timedelta(hours=4)), True
+        )
+
+
+class FriendshipMatchingTests(TestCase):
+    def setUp(self):
+        self.event = EventWithVolunteers.objects.create(
+            name="evt",
+            start_date=datetime.fromisoformat("2025-06-01T08:00:00+02:00"),
+            end_date=datetime.fromisoformat("2025-06-01T18:00:00+02:00"),
+        )
+
+    def add_volunteer(self, firstname, lastname, friend=None):
+        volunteer = Volunteer.objects.create(
+            firstname=firstname, lastname=lastname, email="test@test.com"
+        )
+        availability = VolunteerAvailability.objects.create(
+            event=self.event, volunteer=volunteer
+        )
+        if friend is not None:
+            VolunteerFriendshipWaiting.objects.create(
+                volunteeravailability=availability,
+                firstname=friend[0],
+                lastname=friend[1],
+            )
+        return availability
+
+    def test_should_normalize_names(self):
+        self.assertEqual(normalize("Élodie  DE-LA Tour"), "de elodie la tour")
+        self.assertEqual(normalize("Tour, de la Élodie"), "de elodie la tour")
+
+    def test_should_match_waiting_friendships(self):
+        jean = self.add_volunteer("Jean", "Dupont", friend=("helene", "MARTIN"))
+        helene = self.add_volunteer("Hélène", "Martin")
+        paul = self.add_volunteer("Paul", "Durand", friend=("Marie", "Duponde"))
+        marie = self.add_volunteer("Marie", "Dupond")
+        lea = self.add_volunteer("Léa", "Petit", friend=("Martin", "Hélène"))
+        luc = self.add_volunteer("Luc", "Roux", friend=("Inconnu", "Personne"))
+
+        matches, ambiguous = match_friendships(friendship_availabilities(self.event))
+
+        self.assertListEqual(
+            [(match.availability, match.friend) for match in matches],
+            [(paul, marie)],
+        )
+        self.assertLess(matches[0].score, 1)
+        self.assertListEqual(
+            sorted(
+                (availability.id, [c.id for c in candidates])
+                for availability, candidates in ambiguous
+            ),
+            sorted([(jean.id, [helene.id]), (lea.id, [helene.id]), (luc.id, [])]),
+        )
+
+        with self.assertNumQueries(4):
+            apply_matches(matches)
+        friends = dict(VolunteerAvailability.objects.values_list("id", "friend_id"))
+        self.assertEqual(friends[paul.id], marie.id)
+        self.assertEqual(friends[marie.id], paul.id)
+        self.assertIsNone(friends[jean.id])
+        self.assertEqual(VolunteerFriendshipWaiting.objects.count(), 3)
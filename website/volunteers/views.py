@@ -14,7 +14,6 @@ from .models import (
     Volunteer,
     VolunteerAvailability,
     VolunteerFriendshipWaiting,
-    VolunteerSlot,
 )
 
 logger = logging.getLogger(__name__)
@@ -48,7 +47,7 @@ class RegisterAsVolunteer(generic.detail.SingleObjectMixin, generic.FormView):
         if form_class is None:
             form_class = self.get_form_class()
             self.initial["with_convention"] = self.object.convention is not None
-            self.initial["slots_choices"] = self.object.volunteer_slots()
+            self.initial["slots_choices"] = self.object.volunteer_grid()
             self.initial["event"] = self.object
         return form_class(**self.get_form_kwargs())
 
@@ -98,15 +97,7 @@ class RegisterAsVolunteer(generic.detail.SingleObjectMixin, generic.FormView):
                 )
                 friend.save()
 
-            slots = [
-                VolunteerSlot(
-                    availability=availability,
-                    start_date=slot.start,
-                    end_date=slot.end,
-                )
-                for slot in form.cleaned_data["slots"]
-            ]
-            [s.save() for s in slots]
+            availability.set_slots(form.cleaned_data["slots"])
 
         # TODO move it to tasks
         try:
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -109,6 +110,18 @@ DATABASES = {
     }
 }
 
+# Cache, shared by the web and celery workers when set to a common backend
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
@@ -183,6 +196,19 @@ MAILER_MAX_RETRY = 5
 MAILER_DELAY_BEFORE_RETRY = 30 * 60
 MAILER_GROUP_BY = 10
 
+SCHEDULER_HORIZON = None
+SCHEDULER_OVERLAP = timedelta(hours=2)
+SCHEDULER_POOL_SIZE = 3
+SCHEDULER_POOL_DIVERSITY = 0.1
+
+SCHEDULE_SNAPSHOT_TIMEOUT = 60 * 60
+SCHEDULE_DELTA_MAX_DEPTH = 5
+SCHEDULE_PURGE_CHUNK_SIZE = 5000
+SCHEDULE_PURGE_IN_TASK = False
+SCHEDULE_VOLUNTEERS_PER_PAGE = 50
+
+FRIENDSHIP_MATCH_CUTOFF = 0.85
+
 TEST_RUNNER = "xmlrunner.extra.djangotestrunner.XMLTestRunner"
 
 TEST_OUTPUT_DIR = "../build"